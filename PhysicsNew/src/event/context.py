@@ -1,4 +1,5 @@
 from abc import abstractmethod
+import numpy
 class Context(object):
     '''
     Represents a context that may generate a single 
@@ -29,6 +30,21 @@ class Context(object):
         '''
         return 
     
+    @classmethod
+    def getTimes(cls, contexts):
+        '''
+        Batch version of getTime for a list of contexts of this class.
+        
+        Override this to time all contexts in one vectorized call, by 
+        packing their parameters into arrays. By default, we call getTime
+        on each context. 
+        
+        @return: float array with the time of each context, nan where 
+        getTime would return None
+        '''
+        times = (context.getTime() for context in contexts)
+        return numpy.array([numpy.nan if t is None else t for t in times], dtype=numpy.float64)
+    
     @abstractmethod
     def getEvent(self):
         '''
@@ -37,5 +53,31 @@ class Context(object):
         
         @return: Some subclass of Event
         '''
-        return 
+        return
+    
+    def getObjects(self):
+        '''
+        Returns the world objects this context depends on. When an 
+        event changes any of them, the context is regenerated, see 
+        EventScheduler.update. 
+        
+        @return: an iterable of WorldObject
+        '''
+        return ()
+
 
+def timeContexts(contexts):
+    '''
+    Times a list of contexts with one getTimes call for each class of 
+    context among them.
+    
+    @return: float array with the time of each context, nan where 
+    getTime would return None
+    '''
+    times = numpy.empty(len(contexts))
+    groups = {}
+    for i, context in enumerate(contexts):
+        groups.setdefault(type(context), []).append(i)
+    for cls, indices in groups.items():
+        times[indices] = cls.getTimes([contexts[i] for i in indices])
+    return times
@@ -1,4 +1,12 @@
 
 class Event(object):
     def __init__(self):
-        return
\ No newline at end of file
+        return
+    
+    def getObjects(self):
+        '''
+        Returns the world objects whose state this event changes.
+        
+        @return: an iterable of WorldObject
+        '''
+        return ()
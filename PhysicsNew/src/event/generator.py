@@ -1,6 +1,7 @@
 from abc import abstractmethod
 from world.world import World
 from timeit import itertools
+import functools
 
 
 '''
@@ -26,6 +27,9 @@ Let gen = world -> \tau iterator, and mod = \tau iterator -> \gamma iterator
 
 Note that gen' = mod o gen is a valid enumerator. Thus, we can place additional
 restrictions to the gen function by composition.
+
+For example, withinHorizon gives a mod that drops the values whose contexts
+cannot occur within a time horizon, using a cheap lower bound of their time.
 '''
 
 class Generator(object):
@@ -35,17 +39,23 @@ class Generator(object):
     form of an iterable. This iterable is accessable
     through the __iter__ method and must be implemented
     '''
-    def __init__(self, integrator, world):
+    def __init__(self, integrator, world, horizon=None):
+        '''
+        @param horizon: contexts that cannot occur within this time may be 
+        left out by __iter__. None means no contexts are left out.
+        '''
         if not isinstance(world, World):
             raise TypeError("World \"{}\" passed as parameter to Generator is not of instance of class World".format(world))
         self.integrator = integrator
         self.world = world
+        self.horizon = horizon
         
     @abstractmethod
     def __iter__(self):
         '''
         Generates a series of contexts that describes the space of 
-        events that is being described by this generator.
+        events that is being described by this generator. If self.horizon
+        is not None, it may skip contexts whose time is certainly later.
         
         @return: a finite-sized iterator where each element is 
         instance of Context. 
@@ -53,6 +63,39 @@ class Generator(object):
         @see: event.context.Context
         '''
         return
+
+class FunctionGenerator(Generator):
+    '''
+    A generator whose contexts come from a function, which is called 
+    again for every iteration.
+    '''
+    def __init__(self, integrator, world, horizon, iterate):
+        '''
+        @param iterate: function without arguments that returns an iterable
+        of contexts
+        '''
+        super(FunctionGenerator, self).__init__(integrator, world, horizon)
+        self.iterate = iterate
+    
+    def __iter__(self):
+        return iter(self.iterate())
+
+def withinHorizon(boundFn, integrator, horizon):
+    '''
+    Enumeration modifier that drops the values whose contexts cannot occur
+    within horizon, before the contexts are even created. It composes with
+    an enumerator like any other mod:
+    
+    gen' = lambda world: withinHorizon(boundFn, integrator, horizon)(gen(world))
+    
+    @param boundFn: (integrator, tau) -> float, a cheap lower bound of the 
+    time of the context for a value, e.g. distance over the maximum closing
+    speed. 
+    @return: a function tau iterator -> tau iterator
+    '''
+    def mod(values):
+        return (v for v in values if boundFn(integrator, v) <= horizon)
+    return mod
     
 ''' *** Compositional Generators *** '''
     
@@ -81,16 +124,27 @@ class AggregateGenerator:
         '''
         self.generators = generators
         
-    def __call__(self, integrator, world):
-        g = Generator(integrator, world)
+    def __call__(self, integrator, world, horizon=None):
         def it():
-            generators = itertools.map(lambda x : x(integrator, world), self.generators)
+            generators = itertools.imap(lambda x : x(integrator, world, horizon), self.generators)
             
             # simply chain together all of the generators
             return itertools.chain.from_iterable(generators)
         
-        g.__iter__ = it 
-        return it 
+        return FunctionGenerator(integrator, world, horizon, it)
+    
+    def schedule(self, scheduler, integrator, world):
+        '''
+        Adds the contexts of all generators to an EventScheduler. Only the
+        contexts of compositional generators are regenerated after events.
+        
+        @see: CompositionalGenerator.schedule
+        '''
+        for generator in self.generators:
+            if isinstance(generator, (AggregateGenerator, CompositionalGenerator)):
+                generator.schedule(scheduler, integrator, world)
+            else:
+                scheduler.extend(generator(integrator, world))
 
 class CompositionalGenerator:
     '''
@@ -115,18 +169,50 @@ class CompositionalGenerator:
     contexts = agg(integrator, world)
     for context in contexts:
         ...
+    
+    With a boundFn, values whose contexts cannot occur within the horizon 
+    are skipped before contextFn is called, see withinHorizon.
     '''
-    def __init__(self, enumerationFn, contextFn):
+    def __init__(self, enumerationFn, contextFn, boundFn=None):
+        '''
+        @param boundFn: optional (integrator, tau) -> float, a cheap lower 
+        bound of the time of the context that contextFn makes for a value
+        '''
         self.enumerationFn = enumerationFn
         self.contextFn = contextFn
+        self.boundFn = boundFn
     
-    def __call__(self, integrator, world):
-        g = Generator(integrator, world)
+    def __call__(self, integrator, world, horizon=None):
         def it():
             values = self.enumerationFn(world)
+            if horizon is not None and self.boundFn is not None:
+                values = withinHorizon(self.boundFn, integrator, horizon)(values)
             for v in values:
                 yield self.contextFn(integrator, v)
                 
-        g.__iter__ = it
-        return g    
-    
\ No newline at end of file
+        return FunctionGenerator(integrator, world, horizon, it)
+    
+    def schedule(self, scheduler, integrator, world):
+        '''
+        Adds a context for every value of the enumeration to an 
+        EventScheduler. When an event changes an object of a context, the
+        scheduler calls contextFn again on the same value, so we do not
+        enumerate the whole world after each event.
+        
+        With a boundFn, contexts that cannot occur within the horizon of the
+        scheduler are held back without being timed.
+        
+        @see: event.scheduler.EventScheduler.update, EventScheduler.setHorizon
+        '''
+        contexts = []
+        bounds = []
+        for v in self.enumerationFn(world):
+            regenerate = functools.partial(self.contextFn, integrator, v)
+            bound = None if self.boundFn is None else functools.partial(self.boundFn, integrator, v)
+            context = regenerate()
+            scheduler.track(context, regenerate, bound)
+            contexts.append(context)
+            bounds.append(bound)
+        
+        # contexts of the same class are timed together
+        scheduler.extend(contexts, bounds)
@@ -0,0 +1,233 @@
+'''
+Finds the next event among the contexts of a generator.
+
+Rather than sorting all contexts by time, and then asking each of them
+for its event in turn, the scheduler keeps its contexts in a heap and
+only asks the ones at the front. Finding the next event is O(k log n),
+where k is the number of contexts popped before the first one that
+produces an event.
+
+After an event, only the contexts that depend on the objects the event
+changed are regenerated. All other contexts keep their times, which are
+stored relative to the clock of the scheduler, so moving the clock forward
+shifts them all at once.
+
+With a horizon, contexts with a lower bound of their time beyond it are
+held back without being timed, and nextEvent only looks up to the horizon.
+Once it gets there, the caller moves the horizon forward with setHorizon.
+
+@see: event.context.Context, event.generator.Generator
+'''
+# without it, event would refer to the sibling module event.event here
+from __future__ import absolute_import
+import heapq
+import itertools
+import numpy
+from event.context import timeContexts
+
+class EventScheduler(object):
+    '''
+    A priority queue of contexts, ordered by Context.getTime.
+
+    Example usage:
+
+    scheduler = EventScheduler()
+    scheduler.setHorizon(horizon) # optional
+    generator.schedule(scheduler, integrator, world)
+    while True:
+        next = scheduler.nextEvent()
+        if next is None:
+            break
+        dt, event = next
+        ... advance the world by dt
+        if event is None:
+            # no event until the horizon, look further ahead
+            scheduler.update(dt, [])
+            scheduler.setHorizon(horizon)
+            continue
+        ... apply the event
+        scheduler.update(dt, event.getObjects())
+    '''
+    def __init__(self, contexts=()):
+        '''
+        @param contexts: an iterable of contexts, e.g. a Generator
+        '''
+        self.heap = [] # entries [time, count, context], context is None once discarded
+        self.entries = {} # context -> its entry in the heap
+        # breaks ties between equal times, since contexts cannot be compared
+        self.counter = itertools.count()
+        self.now = 0.0
+
+        self.horizon = None # on the clock, see setHorizon
+        self.pruned = [] # entries [bound, count, context] held back by the horizon
+
+        self.dependents = {} # world object -> tracked contexts that depend on it
+        self.regenerators = {} # tracked context -> (regenerate, bound), see track
+        self.extend(contexts)
+
+    def _entry(self, context, time):
+        entry = [self.now + time, next(self.counter), context]
+        self.entries[context] = entry
+        return entry
+
+    def push(self, context):
+        '''
+        Adds a context to the queue, unless its time is None.
+        @return: True iff the context was added
+        '''
+        time = context.getTime()
+        if time is None:
+            return False
+        heapq.heappush(self.heap, self._entry(context, time))
+        return True
+
+    def extend(self, contexts, bounds=None):
+        '''
+        Adds all contexts whose time is not None to the queue. Contexts of
+        the same class are timed in a single call, see Context.getTimes.
+        @param bounds: optional list with a function for each context, or 
+        None, that returns a lower bound of its time. Contexts bounded beyond
+        the horizon are held back untimed.
+        '''
+        contexts = list(contexts)
+        if bounds is not None and self.horizon is not None:
+            within = []
+            for context, bound in zip(contexts, bounds):
+                time = None if bound is None else bound()
+                if time is not None and self.now + time > self.horizon:
+                    heapq.heappush(self.pruned, self._entry(context, time))
+                else:
+                    within.append(context)
+            contexts = within
+        times = timeContexts(contexts).tolist()
+        entries = [self._entry(contexts[i], times[i])
+                   for i in numpy.flatnonzero(~numpy.isnan(times))]
+
+        if len(entries) > len(self.heap):
+            # building the heap anew is linear
+            self.heap.extend(entries)
+            heapq.heapify(self.heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+
+    def add(self, context, regenerate, bound=None):
+        '''
+        Adds a context that is regenerated whenever an event changes one of
+        its objects, see update. The context is tracked even if its time is
+        None, since it may occur once its objects have changed.
+        @param regenerate: function without arguments, that returns the
+        context for the new state of the objects
+        @param bound: optional function without arguments, that returns a 
+        lower bound of the time of the context regenerate returns
+        '''
+        self.track(context, regenerate, bound)
+        self.extend([context], [bound])
+
+    def track(self, context, regenerate, bound=None):
+        '''
+        Like add, but does not queue the context. This lets us queue many
+        tracked contexts at once with extend.
+        '''
+        for obj in context.getObjects():
+            self.dependents.setdefault(obj, set()).add(context)
+        self.regenerators[context] = (regenerate, bound)
+
+    def discard(self, context):
+        '''
+        Removes a context from the queue, and stops tracking it.
+        '''
+        entry = self.entries.pop(context, None)
+        if entry is not None:
+            entry[2] = None # skipped when it reaches the front of the heap
+        if self.regenerators.pop(context, None) is not None:
+            for obj in context.getObjects():
+                dependents = self.dependents.get(obj)
+                if dependents is not None:
+                    dependents.discard(context)
+                    if not dependents:
+                        del self.dependents[obj]
+
+    def update(self, dt, objects):
+        '''
+        Moves the clock forward by dt, and regenerates the tracked contexts
+        that depend on any of objects. The times of all other contexts are
+        kept, dt less than before.
+        @param dt: the time that passed since the last update
+        @param objects: the world objects that have changed
+        @return: the number of regenerated contexts
+        '''
+        self.now += dt
+        stale = set()
+        for obj in objects:
+            stale.update(self.dependents.get(obj, ()))
+
+        regenerated = []
+        bounds = []
+        for context in stale:
+            regenerate, bound = self.regenerators[context]
+            self.discard(context)
+            context = regenerate()
+            self.track(context, regenerate, bound)
+            regenerated.append(context)
+            bounds.append(bound)
+        self.extend(regenerated, bounds)
+        return len(stale)
+
+    def setHorizon(self, horizon):
+        '''
+        Limits nextEvent to the events within horizon of the clock, and
+        times the held back contexts whose bound is now within the horizon.
+        @param horizon: time from now, or None for no limit
+        '''
+        self.horizon = None if horizon is None else self.now + horizon
+        released = []
+        while self.pruned and (self.horizon is None or self.pruned[0][0] <= self.horizon):
+            _, _, context = heapq.heappop(self.pruned)
+            if context is not None:
+                del self.entries[context]
+                released.append(context)
+        self.extend(released)
+
+    def __len__(self):
+        '''
+        @return: the number of contexts that are queued or held back
+        '''
+        return len(self.entries)
+
+    def _dropDiscarded(self):
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+
+    def peekTime(self):
+        '''
+        @return: the time until the earliest context in the queue, or None if
+        it is empty. Note that this context may not produce an event.
+        '''
+        self._dropDiscarded()
+        if not self.heap:
+            return None
+        return self.heap[0][0] - self.now
+
+    def nextEvent(self):
+        '''
+        Pops contexts in order of time, and calls getEvent on each until one
+        of them produces an event. The popped contexts are not added back to
+        the queue, but tracked contexts are still regenerated by update.
+        @return: (time, event) for the earliest event, where time is relative
+        to the clock. If there is no event before the horizon, but contexts
+        are left beyond it, (time, None) where time is the time until the 
+        horizon, see setHorizon. None if no context is left.
+        '''
+        while True:
+            self._dropDiscarded()
+            if not self.heap or (self.horizon is not None and self.heap[0][0] > self.horizon):
+                break
+            time, _, context = heapq.heappop(self.heap)
+            del self.entries[context]
+            event = context.getEvent()
+            if event is not None:
+                return time - self.now, event
+        if self.horizon is not None and self.entries:
+            return self.horizon - self.now, None
+        return None
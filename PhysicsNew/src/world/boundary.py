@@ -1,18 +1,57 @@
-from scipy.stats.vonmises_cython import numpy
+from __future__ import absolute_import
+import numpy
 from abc import abstractmethod
-from test.test_decorators import memoize
 from world.connection import Connection2D, Connection3D
+from world.meshBuffer import MeshBuffer
 
 class Boundary(object):
     ''' 
     abstract class that represents a boundary.
     Methods are defined in a generic way that will allow
     a broad range of extensions
+    
+    Boundary2D and Boundary3D are views of boundary index of a MeshBuffer,
+    which holds the vertices, normals and areas of many boundaries at once.
     '''
+    __slots__ = ('dim', 'buffer', 'index')
+    
     def __init__(self, dim):
         self.dim = dim
         return
     
+    @classmethod
+    def fromBuffer(cls, buffer, index):
+        '''
+        @param buffer: the MeshBuffer that holds this boundary
+        @param index: the index of this boundary inside of buffer
+        @return: a boundary that is a view of the buffer, without copying any vertices
+        '''
+        boundary = cls.__new__(cls)
+        Boundary.__init__(boundary, buffer.dim)
+        boundary.buffer = buffer
+        boundary.index = index
+        return boundary
+    
+    def get(self, idx):
+        '''
+        Returns the ith vertex
+        '''
+        return self.buffer.vertices[self.buffer.indices[self.index, idx]]
+    
+    def norm(self):
+        '''
+        return a unit vector in the direction of the norm.
+        '''
+        return self.buffer.normals[self.index]
+    
+    def _sameVertex(self, a, otherBoundary, b):
+        '''
+        @return: True iff vertex a of this boundary is vertex b of the other one
+        '''
+        if self.buffer is otherBoundary.buffer:
+            return self.buffer.indices[self.index, a] == otherBoundary.buffer.indices[otherBoundary.index, b]
+        return numpy.array_equal(self.get(a), otherBoundary.get(b))
+    
     @abstractmethod
     def getConnection(self, otherBoundary):
         '''
@@ -24,10 +63,11 @@ class Boundary(object):
         return
     
     @abstractmethod
-    def isParallel(self, boundary):
+    def isParallel(self, boundary, tolerance=1e-9):
         '''
         @param boundary: another boundary that we will test if it's 
         parallel to this ones
+        @param tolerance: maximal difference of the unit normals
         @return: True iff the other boundary is parallel to this one.
         In the 2d case, they must be along the same line, while 
         the two boundary planes must be level in the 3d case.
@@ -63,58 +103,56 @@ class Boundary2D(Boundary):
     
     Essentially a line in two dimensions.
     '''
+    __slots__ = ()
+    
     def __init__(self, x1, y1, x2, y2):
         '''
         @param x1: The first position of the boundary (x axis)
         @param y1: The first position of the boundary (y axis)
         @param x2: The second position of the boundary (x axis)
         @param y2: The second position of the boundary (y axis)
+        
+        The boundary gets a buffer of its own until a Mesh is made of it, 
+        which moves it into a buffer shared with the other boundaries of the 
+        mesh, see MeshBuffer.share. Use MeshBuffer.boundaries to create the 
+        boundaries of a whole mesh in one shared buffer from the start.
         '''
-        super(Boundary, self).__init__(2)
-        self.pos = numpy.array([x1, y1])
-        self.vec = numpy.array([x2, y2]) - self.pos
+        super(Boundary2D, self).__init__(2)
+        self.buffer = MeshBuffer([[x1, y1], [x2, y2]], [[0, 1]])
+        self.index = 0
     
+    @property
+    def pos(self):
+        return self.get(0)
+    
+    @property
+    def vec(self):
+        return self.get(1) - self.get(0)
     
     def getConnection(self, otherBoundary):
         for a in xrange(self.dim):
             for b in xrange(self.dim):
-                if self.get(a) == otherBoundary.get(b):
+                if self._sameVertex(a, otherBoundary, b):
                      return Connection2D(self, otherBoundary, a, b)
         return None
     
     def vertex1(self):
-        return self.pos
+        return self.get(0)
     
     def vertex2(self):
-        return self.pos + self.vec
+        return self.get(1)
     
-    def isParallel(self, boundary):
+    def isParallel(self, boundary, tolerance=1e-9):
         '''
         The boundaries should be parallel if the norms are equal
-        todo make approx equal
+        up to tolerance
         '''
-        return self.norm() == boundary.norm() or \
-             - self.norm() == boundary.norm()
-    
-    @memoize
-    def norm(self):
-        '''
-        return a unit vector in the direction of the norm.
-        '''
-        v = numpy.array([-self.vec[1], self.vec[0]])
-        return v / numpy.linalg.norm(v) 
+        return numpy.allclose(self.norm(), boundary.norm(), rtol=0, atol=tolerance) or \
+             numpy.allclose(-self.norm(), boundary.norm(), rtol=0, atol=tolerance)
     
     def carvedVolume(self):
         # signum(N . pos) * ||pos x vec||/2
-        return numpy.sign(numpy.dot(self.pos, self.norm())) \
-             * numpy.linalg.norm(numpy.cross(self.pos, self.vec)) / 2
-    
-    @memoize
-    def get(self, idx):
-        '''
-        Returns the ith vertex
-        '''
-        return numpy.array([self.vertex1(), self.vertex2()])[idx]
+        return self.buffer.carvedVolumes()[self.index]
     
 class Boundary3D(Boundary):
     '''
@@ -124,36 +162,44 @@ class Boundary3D(Boundary):
     Essentially a triangle in three dimensions. We disallow triangles
     with zero area.
     '''
+    __slots__ = ()
+    
     def __init__(self, x1, y1, z1, x2, y2, z2, x3, y3, z3):
         '''
         @param x1: The first position of the boundary (x axis)
         @param y1: The first position of the boundary (y axis)
         @param x2: The second position of the boundary (x axis)
         @param y2: The second position of the boundary (y axis)
-        '''
-        super(Boundary, self).__init__(3)
-        self.pos = numpy.array([x1, y1, z1])
-        self.vec1 = numpy.array([x2, y2, z2]) - self.pos
-        self.vec2 = numpy.array([x3, y3, z3]) - self.pos
-        
-        if self.area() == 0:
-            raise ValueError("Error: specified triangle has zero area. Either all three points are the same or all three lie on the same line")
         
+        The boundary gets a buffer of its own until a Mesh is made of it, 
+        which moves it into a buffer shared with the other boundaries of the 
+        mesh, see MeshBuffer.share. Use MeshBuffer.boundaries to create the 
+        boundaries of a whole mesh in one shared buffer from the start.
+        '''
+        super(Boundary3D, self).__init__(3)
+        # MeshBuffer raises if the triangle has zero area, 
+        # i.e. all three points are the same or all three lie on the same line
+        self.buffer = MeshBuffer([[x1, y1, z1], [x2, y2, z2], [x3, y3, z3]], [[0, 1, 2]])
+        self.index = 0
+    
+    @property
+    def pos(self):
+        return self.get(0)
+    
+    @property
+    def vec1(self):
+        return self.get(1) - self.get(0)
+    
+    @property
+    def vec2(self):
+        return self.get(2) - self.get(0)
         
     def area(self):
         ''' 
         returns the area of this boundary.
         I'm still not sure if this will have any use
         '''
-        return numpy.linalg.norm(numpy.cross(self.vec1, self.vec2)) / 2.0
-    
-    @memoize
-    def norm(self):
-        '''
-        Returns normal to this plane
-        '''
-        v = numpy.cross(self.vec1, self.vec2)
-        return v / numpy.linalg.norm(v)
+        return self.buffer.areas[self.index]
     
     def getConnection(self, otherBoundary):
         for a in xrange(self.dim):
@@ -162,17 +208,16 @@ class Boundary3D(Boundary):
                     for d in xrange(self.dim):
                         if c == d:
                             continue
-                        if self.get(a) == otherBoundary.get(c) and \
-                           self.get(b) == otherBoundary.get(d):
+                        if self._sameVertex(a, otherBoundary, c) and \
+                           self._sameVertex(b, otherBoundary, d):
                             return Connection3D(self, otherBoundary, a, b, c, d)
                 
         return None
     
-    def isParallel(self, boundary):
-        return boundary.norm() == self.norm() \
-            or -boundary.norm() == self.norm()
+    def isParallel(self, boundary, tolerance=1e-9):
+        return numpy.allclose(boundary.norm(), self.norm(), rtol=0, atol=tolerance) \
+            or numpy.allclose(-boundary.norm(), self.norm(), rtol=0, atol=tolerance)
     
-    @memoize
     def carvedVolume(self):
         '''
         Basic linalg, since we carve out volume from the origin.
@@ -184,22 +229,13 @@ class Boundary3D(Boundary):
         The first term is for the direction this volume is with respect to 
         the origin.
         '''
-        return numpy.sign(numpy.dot(self.pos, self.norm())) \
-             * numpy.dot(self.pos, numpy.cross(self.vec1, self.vec2)) / 6.0
+        return self.buffer.carvedVolumes()[self.index]
     
     def vertex1(self):
-        return self.pos
+        return self.get(0)
     
     def vertex2(self):
-        return self.pos + self.vec1
+        return self.get(1)
     
     def vertex3(self):
-        return self.pos + self.vec2
-    
-    @memoize
-    def get(self, idx):
-        '''
-        Returns the ith vertex
-        '''
-        return [self.vertex1(), self.vertex2(), self.vertex3()][idx]
-    
\ No newline at end of file
+        return self.get(2)
@@ -0,0 +1,304 @@
+'''
+Bounding volume hierarchy over the boundaries of a mesh, for collision
+queries of particles against meshes.
+
+The hierarchy is a binary tree of axis aligned boxes, stored as flat arrays
+in depth first order: the left child of an inner node n is node n + 1, its
+right child is right[n]. Each leaf holds a contiguous range of order, the
+boundary indices sorted by leaf.
+'''
+import heapq
+import math
+import numpy
+
+class BoundingVolumeHierarchy(object):
+    '''
+    Axis aligned box hierarchy over line segments in 2d or triangles in 3d.
+
+    The tree is built once, splitting nodes where the surface area heuristic
+    is the lowest. When the boundaries move, refit updates the boxes without
+    changing the tree, which stays efficient as long as the boundaries keep
+    their arrangement, e.g. when the whole mesh moves rigidly.
+    '''
+    def __init__(self, corners, maxLeafSize=4, numBins=16, traversalCost=1.0):
+        '''
+        @param corners: (F, dim, dim) array, such that corners[i] are the
+        vertices of boundary i.
+        @param maxLeafSize: the maximum number of boundaries in a leaf
+        @param numBins: the number of candidate split planes per axis and node
+        @param traversalCost: the cost of visiting a node, relative to testing
+        a boundary
+        '''
+        corners = numpy.asarray(corners, dtype=numpy.float64)
+        if corners.ndim != 3 or corners.shape[1] != corners.shape[2] or corners.shape[2] not in [2, 3]:
+            raise ValueError("Expected a corner array of shape (F, 2, 2) or (F, 3, 3)")
+        if len(corners) == 0:
+            raise ValueError("Cannot build a hierarchy over no boundaries")
+
+        self.dim = corners.shape[2]
+        self.maxLeafSize = maxLeafSize
+        self.numBins = numBins
+        self.traversalCost = traversalCost
+        self.pose = None # the pose we were last refit to, see Mesh.worldHierarchy
+
+        self._build(corners)
+        self.refit(corners)
+
+    def _build(self, corners):
+        triLo = corners.min(axis=1)
+        triHi = corners.max(axis=1)
+        centroids = corners.mean(axis=1)
+
+        order = numpy.arange(len(corners))
+        right, start, count, depth = [], [], [], []
+
+        # the left child is pushed last, so that it is always the next node
+        stack = [(0, len(corners), 0, -1)] # begin, end, depth, node whose right child this is
+        while stack:
+            begin, end, level, parent = stack.pop()
+            node = len(right)
+            if parent >= 0:
+                right[parent] = node
+            right.append(-1)
+            start.append(begin)
+            count.append(end - begin)
+            depth.append(level)
+
+            if end - begin <= self.maxLeafSize:
+                continue
+
+            indices = order[begin:end]
+            isLeft = self._findSplit(triLo[indices], triHi[indices], centroids[indices])
+            order[begin:end] = numpy.concatenate([indices[isLeft], indices[~isLeft]])
+            middle = begin + numpy.count_nonzero(isLeft)
+            count[node] = 0
+
+            stack.append((middle, end, level + 1, node))
+            stack.append((begin, middle, level + 1, -1))
+
+        self.order = order
+        self.right = numpy.array(right, dtype=numpy.intp)
+        self.start = numpy.array(start, dtype=numpy.intp)
+        self.count = numpy.array(count, dtype=numpy.intp)
+
+        # leaves in depth first order cover order[0:F] in ascending, contiguous ranges
+        self.leaves = numpy.flatnonzero(self.right < 0)
+
+        # inner nodes grouped by depth, deepest first, so refit can do one level at a time
+        depth = numpy.array(depth)
+        inner = numpy.flatnonzero(self.right >= 0)
+        self.levels = [inner[depth[inner] == level] for level in
+                       sorted(set(depth[inner]), reverse=True)]
+
+        self.lo = numpy.empty((len(right), self.dim))
+        self.hi = numpy.empty((len(right), self.dim))
+
+    def _findSplit(self, triLo, triHi, centroids):
+        '''
+        Binned surface area heuristic: centroids are sorted into numBins bins
+        along each axis, and we take the split between bins that minimizes the
+        summed areas of both children, weighted by their boundary counts.
+        @return: boolean array, True for the boundaries in the left child
+        '''
+        n = len(centroids)
+        lo, hi = centroids.min(axis=0), centroids.max(axis=0)
+
+        bestCost, bestSplit = numpy.inf, None
+        for axis in xrange(self.dim):
+            extent = hi[axis] - lo[axis]
+            if extent <= 0:
+                continue
+            bins = numpy.minimum(((centroids[:, axis] - lo[axis]) * (self.numBins / extent)).astype(numpy.intp),
+                                 self.numBins - 1)
+            counts = numpy.bincount(bins, minlength=self.numBins)
+            binLo = numpy.full((self.numBins, self.dim), numpy.inf)
+            binHi = numpy.full((self.numBins, self.dim), -numpy.inf)
+            byBin = numpy.argsort(bins, kind='mergesort')
+            used = numpy.flatnonzero(counts)
+            binStart = numpy.cumsum(counts)[used] - counts[used]
+            binLo[used] = numpy.minimum.reduceat(triLo[byBin], binStart)
+            binHi[used] = numpy.maximum.reduceat(triHi[byBin], binStart)
+
+            # split k puts bins [0, k) left and [k, numBins) right
+            leftCount = numpy.cumsum(counts)[:-1]
+            leftArea = _area(numpy.minimum.accumulate(binLo)[:-1], numpy.maximum.accumulate(binHi)[:-1])
+            rightCount = n - leftCount
+            rightArea = _area(numpy.minimum.accumulate(binLo[::-1])[::-1][1:],
+                              numpy.maximum.accumulate(binHi[::-1])[::-1][1:])
+
+            valid = (leftCount > 0) & (rightCount > 0)
+            if not numpy.any(valid):
+                continue
+            cost = numpy.where(valid, leftArea * leftCount + rightArea * rightCount, numpy.inf)
+            k = numpy.argmin(cost)
+            if cost[k] < bestCost:
+                bestCost, bestSplit = cost[k], (axis, bins, k + 1)
+
+        if bestSplit is None:
+            # all centroids coincide, split in halves
+            return numpy.arange(n) < n // 2
+        axis, bins, k = bestSplit
+        return bins < k
+
+    def refit(self, corners):
+        '''
+        Recomputes the boxes of all nodes for moved boundaries, keeping the tree.
+        @param corners: (F, dim, dim) array, the new vertices of every boundary,
+        in the order the hierarchy was built with
+        '''
+        corners = numpy.asarray(corners, dtype=numpy.float64)
+        self.corners = corners
+        if self.dim == 2:
+            vec = corners[:, 1] - corners[:, 0]
+            self.normals = numpy.column_stack([-vec[:, 1], vec[:, 0]])
+        else:
+            self.normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+        sortedLo = corners.min(axis=1)[self.order]
+        sortedHi = corners.max(axis=1)[self.order]
+        self.lo[self.leaves] = numpy.minimum.reduceat(sortedLo, self.start[self.leaves])
+        self.hi[self.leaves] = numpy.maximum.reduceat(sortedHi, self.start[self.leaves])
+        for nodes in self.levels:
+            left, right = nodes + 1, self.right[nodes]
+            self.lo[nodes] = numpy.minimum(self.lo[left], self.lo[right])
+            self.hi[nodes] = numpy.maximum(self.hi[left], self.hi[right])
+
+    def copy(self):
+        '''
+        @return: a hierarchy with the same tree, whose boxes can be refit
+        independently of this one
+        '''
+        other = object.__new__(BoundingVolumeHierarchy)
+        other.__dict__.update(self.__dict__)
+        other.lo = self.lo.copy()
+        other.hi = self.hi.copy()
+        other.pose = None
+        return other
+
+    def firstHit(self, pos, vel, acc, tMax, tMin=0.0):
+        '''
+        Finds the earliest time a particle at pos + vel t + acc t^2 / 2 hits a
+        boundary, for tMin <= t <= tMax. Nodes are visited in the order of the
+        earliest time the path can enter their box, and we stop as soon as that
+        is later than the best hit so far.
+        @return: (t, i), the time of the hit and the index of the boundary, or
+        None if the particle hits nothing.
+        '''
+        pos = [float(x) for x in pos]
+        vel = [float(x) for x in vel]
+        acc = [float(x) for x in acc]
+        path = zip(pos, vel, acc)
+
+        best, bestIndex = tMax, None
+        entry = self._entryTime(0, path, tMin, best)
+        heap = [] if entry is None else [(entry, 0)]
+        while heap:
+            entry, node = heapq.heappop(heap)
+            if entry > best:
+                break
+            if self.right[node] < 0:
+                begin = self.start[node]
+                for i in self.order[begin:begin + self.count[node]]:
+                    t = self._hitTime(i, pos, vel, acc, tMin, best)
+                    if t is not None and (bestIndex is None or t < best):
+                        best, bestIndex = t, i
+                continue
+            for child in (node + 1, self.right[node]):
+                entry = self._entryTime(child, path, tMin, best)
+                if entry is not None:
+                    heapq.heappush(heap, (entry, child))
+
+        if bestIndex is None:
+            return None
+        return best, int(bestIndex)
+
+    def _entryTime(self, node, path, t0, t1):
+        '''
+        @return: a lower bound of the time the path enters the box of node
+        during [t0, t1], or None if it does not
+        '''
+        lo, hi = self.lo[node], self.hi[node]
+        for axis, (x, v, a) in enumerate(path):
+            interval = _slabInterval(x, v, a, lo[axis], hi[axis], t0, t1)
+            if interval is None:
+                return None
+            t0, t1 = max(t0, interval[0]), min(t1, interval[1])
+            if t0 > t1:
+                return None
+        return t0
+
+    def _hitTime(self, i, pos, vel, acc, t0, t1):
+        '''
+        @return: the earliest time in [t0, t1] the path crosses boundary i, or None
+        '''
+        normal = self.normals[i]
+        corners = self.corners[i]
+        offset = numpy.subtract(pos, corners[0])
+        for t in quadraticRoots(0.5 * numpy.dot(normal, acc), numpy.dot(normal, vel),
+                                numpy.dot(normal, offset)):
+            if t < t0 or t > t1:
+                continue
+            point = offset + numpy.multiply(vel, t) + numpy.multiply(acc, 0.5 * t * t)
+            if self._contains(corners, normal, point):
+                return t
+        return None
+
+    def _contains(self, corners, normal, point, tolerance=1e-12):
+        '''
+        @param point: a point on the plane of the boundary, relative to corners[0]
+        @return: True iff point lies on the boundary
+        '''
+        edge = corners[1] - corners[0]
+        if self.dim == 2:
+            s = numpy.dot(point, edge) / numpy.dot(edge, edge)
+            return -tolerance <= s <= 1 + tolerance
+        other = corners[2] - corners[0]
+        scale = numpy.dot(normal, normal)
+        u = numpy.dot(normal, numpy.cross(point, other)) / scale
+        v = numpy.dot(normal, numpy.cross(edge, point)) / scale
+        return u >= -tolerance and v >= -tolerance and u + v <= 1 + tolerance
+
+def _area(lo, hi):
+    '''
+    @return: surface area (3d) or perimeter (2d) of the boxes with corners
+    lo and hi, 0 for empty boxes
+    '''
+    extent = numpy.maximum(hi - lo, 0)
+    extent[~numpy.isfinite(extent)] = 0
+    if extent.shape[-1] == 2:
+        return 2 * extent.sum(axis=-1)
+    x, y, z = extent[..., 0], extent[..., 1], extent[..., 2]
+    return 2 * (x * y + y * z + z * x)
+
+def quadraticRoots(a, b, c):
+    '''
+    @return: the sorted real roots of a t^2 + b t + c, none if the polynomial
+    is constant
+    '''
+    if a == 0:
+        if b == 0:
+            return []
+        return [-c / b]
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return []
+    # avoids cancellation between b and the square root
+    q = -0.5 * (b + math.copysign(math.sqrt(discriminant), b))
+    if q == 0:
+        return [0.0]
+    return sorted([q / a, c / q])
+
+def _slabInterval(x, v, a, lo, hi, t0, t1, tolerance=1e-9):
+    '''
+    @return: the smallest interval containing every t in [t0, t1] with
+    lo <= x + v t + a t^2 / 2 <= hi, or None if there is no such t
+    '''
+    # the set is a union of intervals, whose ends are t0, t1 or where the path crosses lo or hi
+    candidates = [t0, t1]
+    for bound in (lo, hi):
+        candidates += [t for t in quadraticRoots(0.5 * a, v, x - bound) if t0 < t < t1]
+    margin = tolerance * (1 + abs(lo) + abs(hi))
+    inside = [t for t in candidates if lo - margin <= x + t * (v + 0.5 * a * t) <= hi + margin]
+    if not inside:
+        return None
+    return min(inside), max(inside)
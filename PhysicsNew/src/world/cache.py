@@ -0,0 +1,62 @@
+'''
+Per-instance caching of method results.
+
+Results are stored on the instance itself, so they are freed together with
+the instance, and memory stays bounded however many meshes a run creates.
+'''
+import functools
+
+# every cached method, for cacheStatistics
+cachedMethods = []
+
+class cachedMethod(object):
+    '''
+    Decorator for a method that takes no arguments besides self. The result
+    is computed on the first call and stored on the instance, until it is
+    dropped with invalidate.
+
+    hits and misses count the calls over all instances.
+    '''
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+        self.hits = 0
+        self.misses = 0
+        cachedMethods.append(self)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return functools.partial(self._call, instance)
+
+    def _call(self, instance):
+        cache = instance.__dict__.setdefault('_cachedResults', {})
+        if self.name in cache:
+            self.hits += 1
+            return cache[self.name]
+        self.misses += 1
+        result = self.method(instance)
+        cache[self.name] = result
+        return result
+
+def invalidate(instance, *names):
+    '''
+    Drops cached results of instance.
+    @param names: the names of the methods whose results we drop, all of them
+    if none are given
+    '''
+    cache = instance.__dict__.get('_cachedResults')
+    if cache is None:
+        return
+    if not names:
+        cache.clear()
+    for name in names:
+        cache.pop(name, None)
+
+def cacheStatistics():
+    '''
+    @return: map of 'module.method' -> (hits, misses) for all cached methods
+    '''
+    return {method.method.__module__ + '.' + method.name: (method.hits, method.misses)
+            for method in cachedMethods}
@@ -1,6 +1,5 @@
 from abc import abstractmethod
 import numpy
-from test.test_decorators import memoize
 class BoundaryConnection(object):
     '''
     represents an abstract connection between two boundaries.
@@ -80,7 +79,7 @@ class Connection2D(BoundaryConnection):
         0      | boundary.vertex1()
         1      | boundary.vertex2()
         '''
-        super(BoundaryConnection, self).__init__(2)
+        super(Connection2D, self).__init__(2)
         self.boundary1 = boundary1
         self.boundary2 = boundary2
         self.a = a
@@ -89,7 +88,7 @@ class Connection2D(BoundaryConnection):
         if a > 1 or b > 1:
             raise ValueError("2D boundaries cannot have more than two points!")
         
-        if boundary1.get(a) != boundary2.get(b):
+        if not numpy.array_equal(boundary1.get(a), boundary2.get(b)):
             raise ValueError("Boundary defined by " + boundary1 + "[" + a + "]" + ", " + boundary2 + "[" + b + "] is not connected!")
         
     
@@ -103,7 +102,7 @@ class Connection2D(BoundaryConnection):
         return self.boundary1.get(self.a)
     
     def connectionEqual(self, other):
-        return self.vertex() == other.vertex() 
+        return numpy.array_equal(self.vertex(), other.vertex())
     
     def correlates(self, other):
         for ours in [self.boundary1, self.boundary2]:
@@ -130,7 +129,7 @@ class Connection3D(BoundaryConnection):
         2      | boundary.point3()
     '''
     def __init__(self, boundary1, boundary2, a, b, c, d):
-        super(BoundaryConnection, self).__init__(3)
+        super(Connection3D, self).__init__(3)
         self.boundary1 = boundary1
         self.boundary2 = boundary2
         self.a = a
@@ -138,11 +137,11 @@ class Connection3D(BoundaryConnection):
         self.c = c 
         self.d = d 
         
-        if not filter(lambda x: x > 2, [a, b, c, d]):
+        if filter(lambda x: x > 2, [a, b, c, d]):
             raise ValueError("3D boundaries cannot have more than three points!")
         
-        if boundary1.get(a) != boundary2.get(c) or \
-            boundary1.get(b) != boundary2.get(d) : 
+        if not numpy.array_equal(boundary1.get(a), boundary2.get(c)) or \
+            not numpy.array_equal(boundary1.get(b), boundary2.get(d)) : 
             raise ValueError("Boundary defined by " + boundary1 + "[" + a +  ", " + b +"]" + \
                      ", " + boundary2 + "[" + c + ", " + d + "] is not connected!")
 
@@ -152,7 +151,7 @@ class Connection3D(BoundaryConnection):
     Note: this works and is cool
     '''
     def parity(self, a, b):
-        return (b + 1 % 3) == a 
+        return (b + 1) % 3 == a 
     
     def isConsistent(self, map = {}):
         norm1 = map.get(self.boundary1, 1)
@@ -171,12 +170,12 @@ class Connection3D(BoundaryConnection):
         return self.boundary1.get(self.b)
     
     def connectionEqual(self, other):
-        return (self.vertex1() == other.vertex1() \
-                and self.vertex2() == other.vertex2()) \
-            or (self.vertex1() == other.vertex2() \
-                and self.vertex2() == other.vertex1())
+        return (numpy.array_equal(self.vertex1(), other.vertex1()) \
+                and numpy.array_equal(self.vertex2(), other.vertex2())) \
+            or (numpy.array_equal(self.vertex1(), other.vertex2()) \
+                and numpy.array_equal(self.vertex2(), other.vertex1()))
             
     def correlates(self, other):
         otherVerts = [other.vertex1(), other.vertex2()] 
-        return self.vertex1() in otherVerts\
-            or self.vertex2() in otherVerts
\ No newline at end of file
+        return any(numpy.array_equal(ours, others) 
+                   for ours in [self.vertex1(), self.vertex2()] for others in otherVerts)
\ No newline at end of file
@@ -1,3 +1,4 @@
+from __future__ import absolute_import
 from world.dynamicObject import DynamicObject
 from world.mesh import Mesh
 
@@ -9,8 +10,6 @@ class DynamicMesh(DynamicObject, Mesh):
         @param rot: the initial position of this mesh
         @param mass: the mass of this mesh
         '''
-        super(DynamicObject, self).__init__(dim, pos, mass)
-        super(Mesh, self).__init__(dim, boundaries)
+        DynamicObject.__init__(self, dim, pos, mass)
+        Mesh.__init__(self, dim, boundaries)
         self.rot = rot.copy()
-        
-        
\ No newline at end of file
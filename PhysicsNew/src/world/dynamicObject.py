@@ -1,9 +1,10 @@
 
+from __future__ import absolute_import
 from world.worldObject import WorldObject
 
 class DynamicObject(WorldObject):
     def __init__(self, dim, pos, mass):
-        super(WorldObject, self).__init__(dim, pos)
+        super(DynamicObject, self).__init__(dim, pos)
         self.mass = mass
         
         
@@ -3,6 +3,7 @@ Created on Oct 23, 2015
 
 @author: zkieda
 '''
+from __future__ import absolute_import
 from world.dynamicObject import DynamicObject
 from world.particle import Particle
 
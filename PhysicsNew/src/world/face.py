@@ -6,9 +6,10 @@ Note that this is mostly useful in the 3d case, which all faces cannot be
 described by triangles in 3d. 
 @author: zkieda
 '''
+from __future__ import absolute_import
 from world.staticObject import StaticObject
 import numpy
-from test.test_decorators import memoize
+from world.cache import cachedMethod
 
 class Face(StaticObject):
     '''
@@ -25,12 +26,13 @@ class Face(StaticObject):
     Note: it's possible to have a class extend Face such that 
     we automatically tessalate the 
     '''
-    def __init__(self, dim, boundaries, boundaryMap):
+    def __init__(self, dim, boundaries, boundaryMap, tolerance=1e-9):
         '''
         Instantiate a face.
         @param dim: the number of dimensions this face is in
         @param boundaries: the boundaries that make up this face
         @param boundaryMap: map of type (Boundary -> (Boundary, BoundaryConnection) list)
+        @param tolerance: maximal difference of the unit normals of the boundaries
         @requires: boundaries \subseteq domain(boundaryMap)
         @requires: \forall u, v \in boundaries x boundaries. u.parallel v
         @requires: \forall b \in boundaries b.dim == dim. 
@@ -39,12 +41,14 @@ class Face(StaticObject):
         #initial position is just (0, 0, 0) in its own local space.
         #we transform this as we go in the face's local space, then
         #translate wrt the mesh's world position.
-        super(StaticObject, self).__init__(dim, numpy.zeros(dim))
+        super(Face, self).__init__(dim, numpy.zeros(dim))
+        
+        self.boundaries = boundaries
+        self.tolerance = tolerance
         
         if len(self.boundaries) == 0 :
             raise ValueError("Expected >1 boundaries inside of a Face!")
         
-        self.boundaries = boundaries
         self.boundaryMap = boundaryMap
         
         if not self._checkBoundaries():
@@ -69,35 +73,133 @@ class Face(StaticObject):
         '''
         b0 = self.boundaries[0]
         for bi in self.boundaries[1:]:
-            if not b0.isParallel(bi):
+            if not b0.isParallel(bi, self.tolerance):
                 return False
         
         return True
     
-    @memoize
+    @cachedMethod
     def getExterior(self):
         '''
         returns an array of all of the boundaries that are on the outside of this
         face. This is nice if we want to find all of the faces adjacent to this one
         
-        The array is sorted such that each face is adjacent to one another.
+        The array is sorted such that each face is adjacent to one another. If the
+        face has holes, the outer loop comes first, followed by the loop around 
+        each hole (see getExteriorLoops).
+        '''
+        return [edge for loop in self.getExteriorLoops() for edge in loop]
+    
+    @cachedMethod
+    def getExteriorLoops(self):
+        '''
+        returns the exterior edges of this face as a list of loops, such that
+        consecutive edges of a loop are adjacent, and the last edge is adjacent
+        to the first one. The first loop is the outer one, the others go around
+        holes in the face.
+        
+        In the 2d case, a face is a chain of segments on one line, so there is a 
+        single loop: the connections at the two ends of the chain, ordered along 
+        the line. An end of an open mesh has no connection.
         '''
+        # an edge is on the exterior iff it connects to a boundary outside of this face 
+        members = set(self.boundaries)
         exterior = []
         for boundary in self.boundaries:
-            for neighbor, edge in self.neighborMap:
-                if not neighbor.isParallel(boundary):
+            for neighbor, edge in self.boundaryMap[boundary]:
+                if neighbor not in members:
                     exterior.append(edge)
-                    
-        # exterior now contains a list of boundaries that are on the outer edge of the face.
-        # now, we just need to sort them.
-        return exterior#self._sortExterior(exterior)
+        
+        if self.dim == 2:
+            origin, basis, normal = self.localFrame()
+            exterior.sort(key=lambda edge: numpy.dot(basis[0], edge.vertex()))
+            return [exterior]
+        return self._sortExterior(exterior)
     
-    def _sortExterior(self, exteriorInitial):
+    def _corners(self):
+        '''
+        @return: (F, dim, dim) array of the vertices of every boundary of this face
+        '''
+        return numpy.array([[b.get(k) for k in xrange(self.dim)] for b in self.boundaries],
+                           dtype=numpy.float64)
+    
+    @cachedMethod
+    def localFrame(self):
+        '''
+        The local frame of this face has its origin on the face, and its axes 
+        span the plane (3d) or line (2d) of the face.
+        @return: origin, basis, normal. basis is a (dim - 1, dim) array of 
+        orthonormal rows, and the local coordinates of a point p are 
+        numpy.dot(basis, p - origin)
+        '''
+        corners = self._corners()
+        normal = numpy.asarray(self.boundaries[0].norm(), dtype=numpy.float64)
+        origin = corners[0, 0]
+        u = corners[0, 1] - origin
+        u /= numpy.linalg.norm(u)
+        if self.dim == 2:
+            return origin, u[numpy.newaxis], normal
+        return origin, numpy.array([u, numpy.cross(normal, u)]), normal
+    
+    @cachedMethod
+    def halfSpaces(self):
+        '''
+        Represents this face as a union of convex pieces, each of which is the
+        set of local points p with numpy.dot(A_k, p) <= b_k. A convex face is a 
+        single piece, others are decomposed into few convex pieces.
+        
+        The rows of all pieces are stacked. Rows have unit length, so that a 
+        point is at distance max(numpy.dot(A_k, p) - b_k) outside of piece k.
+        @return: A, b, pieceStart. A is a (m, dim - 1) array, b is an (m,) 
+        array, and piece k is made up of the rows pieceStart[k]:pieceStart[k + 1].
+        '''
+        origin, basis, normal = self.localFrame()
+        local = numpy.einsum('fki,ji->fkj', self._corners() - origin, basis)
+        
+        if self.dim == 2:
+            # the boundaries are segments on one line, which are convex already
+            intervals = _mergeIntervals(numpy.sort(local[:, :, 0], axis=1))
+            rows = [(numpy.array([[1.0], [-1.0]]), numpy.array([hi, -lo])) for lo, hi in intervals]
+        else:
+            rows = [_polygonHalfSpaces(polygon) for polygon in _convexPieces(local)]
+        
+        pieceStart = numpy.cumsum([0] + [len(b) for A, b in rows[:-1]])
+        return (numpy.concatenate([A for A, b in rows]), numpy.concatenate([b for A, b in rows]),
+                pieceStart)
+    
+    def meshHalfSpaces(self):
         '''
-        *** TODO fix in the 2d case -- face will not wrap around as in 3d case
+        halfSpaces, in mesh coordinates. Each piece also gets two rows that bound 
+        the distance of a point from the plane of the face, so a point is in a 
+        piece iff it lies on the face.
+        @return: A, b, pieceStart, like halfSpaces, where A is a (m, dim) array
+        '''
+        A, b, pieceStart = self.halfSpaces()
+        origin, basis, normal = self.localFrame()
+        A = numpy.dot(A, basis)
+        b = b + numpy.dot(A, origin)
         
-        Sorting the exterior: find a sequence a_0... a_{n-1}, where n is the 
-        number of edges in the exterior.
+        # normal . p <= normal . origin and -normal . p <= -normal . origin, after the rows of every piece
+        pieceEnd = numpy.repeat(numpy.append(pieceStart[1:], len(b)), 2)
+        offset = numpy.dot(normal, origin)
+        A = numpy.insert(A, pieceEnd, numpy.tile([normal, -normal], (len(pieceStart), 1)), axis=0)
+        b = numpy.insert(b, pieceEnd, numpy.tile([offset, -offset], len(pieceStart)))
+        return A, b, pieceStart + 2 * numpy.arange(len(pieceStart))
+    
+    def containsPoints(self, points, tolerance=1e-9):
+        '''
+        @param points: (N, dim) array of points, in mesh coordinates
+        @param tolerance: the distance a point may be off the face and still be on it
+        @return: (N,) boolean array, True for the points that are on this face
+        '''
+        A, b, pieceStart = self.meshHalfSpaces()
+        inside = numpy.dot(A, numpy.asarray(points, dtype=numpy.float64).T) <= (b + tolerance)[:, numpy.newaxis]
+        return numpy.logical_and.reduceat(inside, pieceStart, axis=0).any(axis=0)
+    
+    def _sortExterior(self, exteriorInitial):
+        '''
+        Sorting the exterior: find sequences a_0... a_{n-1}, one for each loop 
+        in the exterior, with n edges in the loop.
         
         such that \forall i \in [0, n) a_i correlates a_{i+1} (where i mod n)
         
@@ -105,33 +207,160 @@ class Face(StaticObject):
         we say that a_i and a_{i+1} are correlated iff they are neighbors on
         the exterior.
         '''
-        exteriorFinal=[] # returned list
-        visited = set()
-        i = 0 # initial position
-        j = 0 # j is our counter
-        
-        '''
-        Here, we walk across the exterior of the face's boundaries. 
-        We start at the 0th exterior. For exterior i we will traverse
-        to the next edge if we have not traversed it yet and if 
-        the two edges are correlated. Then, we use the correlated edge
-        as the next edge that we are traversing from. We walk across
-        the exterior in this manner, till we have used every edge on the
-        exterior. This is unfortunately in O(n^2)
-        '''
-        while True:
-            this = exteriorInitial[i]
-            next = exteriorInitial[j]
-            if j != i and next not in visited and this.correlates(next):
-                exteriorFinal.append(next)
-                visited.add(next)
-                i = j
-                j = 0 
-                if len(exteriorFinal) == len(exteriorInitial):
-                    return exteriorFinal
-            else:
-                j = j + 1
-                if len(exteriorInitial) == j:
+        
+        ''' 
+        We key every edge by both of its end points. Then, we walk across 
+        the exterior from an unused edge to an unused edge that shares the
+        end point we arrived at, until we are back at the start of the loop.
+        Every edge is taken out of the keyed lists at most twice, so this 
+        is in O(n). We repeat with the next unused edge for the next loop.
+        '''
+        byVertex = {} # end point -> indices of the exterior edges that end there
+        for i, edge in enumerate(exteriorInitial):
+            for vertex in (edge.vertex1(), edge.vertex2()):
+                byVertex.setdefault(tuple(vertex), []).append(i)
+        
+        used = [False] * len(exteriorInitial)
+        normal = self.boundaries[0].norm()
+        loops = []
+        for start in xrange(len(exteriorInitial)):
+            if used[start]:
+                continue
+            used[start] = True
+            loop = [exteriorInitial[start]]
+            first = tuple(exteriorInitial[start].vertex1())
+            current = tuple(exteriorInitial[start].vertex2())
+            points = [first, current]
+            
+            while current != first:
+                candidates = byVertex[current]
+                while candidates and used[candidates[-1]]:
+                    candidates.pop()
+                if not candidates:
                     raise ValueError("Error in creating face -- specified boundary does not have a closed exterior!")
-                
-                
\ No newline at end of file
+                i = candidates.pop()
+                used[i] = True
+                edge = exteriorInitial[i]
+                loop.append(edge)
+                vertex1, vertex2 = tuple(edge.vertex1()), tuple(edge.vertex2())
+                current = vertex2 if vertex1 == current else vertex1
+                points.append(current)
+            
+            # area enclosed by the loop, projected on the plane of the face
+            points = numpy.array(points)
+            area = abs(numpy.dot(numpy.cross(points[:-1], points[1:]).sum(axis=0), normal)) / 2
+            loops.append((area, loop))
+        
+        # the outer loop encloses all of the others
+        loops.sort(key=lambda item: -item[0])
+        return [loop for area, loop in loops]
+
+def _mergeIntervals(intervals):
+    '''
+    @param intervals: (n, 2) array of (lo, hi) pairs
+    @return: the union of the intervals, as a sorted list of disjoint (lo, hi) pairs
+    '''
+    merged = []
+    for lo, hi in sorted(map(tuple, intervals)):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+def _polygonHalfSpaces(polygon):
+    '''
+    @param polygon: (n, 2) array, the vertices of a convex polygon in counter 
+    clockwise order
+    @return: A, b such that the polygon is the set of p with numpy.dot(A, p) <= b
+    '''
+    edges = numpy.roll(polygon, -1, axis=0) - polygon
+    A = numpy.column_stack([edges[:, 1], -edges[:, 0]]) # outward normals
+    A /= numpy.sqrt(numpy.einsum('ij,ij->i', A, A))[:, numpy.newaxis]
+    return A, numpy.einsum('ij,ij->i', A, polygon)
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+def _isConvex(polygon, tolerance=1e-12):
+    '''
+    @return: True iff the polygon, given counter clockwise, turns left (or 
+    goes straight) at every vertex
+    '''
+    n = len(polygon)
+    return all(_cross(polygon[i - 1], polygon[i], polygon[(i + 1) % n]) >= -tolerance for i in xrange(n))
+
+def _convexHull(points):
+    '''
+    Andrew's monotone chain.
+    @return: the vertices of the convex hull of points, counter clockwise
+    '''
+    points = sorted(set(map(tuple, points)))
+    if len(points) <= 2:
+        return points
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+def _polygonArea(polygon):
+    '''
+    @return: the signed area of the polygon, positive if it is counter clockwise
+    '''
+    return sum(_cross((0, 0), polygon[i - 1], polygon[i]) for i in xrange(len(polygon))) / 2.0
+
+def _convexPieces(triangles, tolerance=1e-9):
+    '''
+    Decomposes the union of 2d triangles into convex polygons. If the union 
+    is convex, it is its convex hull. Otherwise, starting from the triangles, 
+    we merge two pieces across a shared edge whenever their union is convex 
+    (Hertel-Mehlhorn), which gives at most four times the optimal number of 
+    pieces.
+    @param triangles: (F, 3, 2) array of triangles that only meet at their edges
+    @return: list of (n, 2) arrays, the vertices of each piece in counter 
+    clockwise order
+    '''
+    area = sum(abs(_polygonArea(triangle)) for triangle in triangles)
+    hull = _convexHull(triangles.reshape(-1, 2))
+    if abs(_polygonArea(hull) - area) <= tolerance * area:
+        return [numpy.array(hull)]
+    
+    ids = {} # vertex -> index into vertices
+    vertices = []
+    pieces = {} # piece id -> vertex indices, counter clockwise
+    owner = {} # directed edge (a, b) -> the piece that has b right after a
+    for k, triangle in enumerate(triangles):
+        piece = []
+        for vertex in map(tuple, triangle):
+            if vertex not in ids:
+                ids[vertex] = len(vertices)
+                vertices.append(vertex)
+            piece.append(ids[vertex])
+        if _polygonArea(triangle) < 0:
+            piece.reverse()
+        pieces[k] = piece
+        for i in xrange(3):
+            owner[piece[i - 1], piece[i]] = k
+    
+    for (a, b) in list(owner):
+        p, q = owner.get((a, b)), owner.get((b, a))
+        if p is None or q is None or p == q:
+            continue
+        # p runs from b around to a, then q from a around to b closes the loop
+        first, second = pieces[p], pieces[q]
+        i, j = first.index(b), second.index(a)
+        merged = first[i:] + first[:i] + (second[j:] + second[:j])[1:-1]
+        if len(set(merged)) != len(merged) or not _isConvex([vertices[v] for v in merged]):
+            continue
+        del owner[a, b], owner[b, a], pieces[q]
+        pieces[p] = merged
+        for i in xrange(len(merged)):
+            owner[merged[i - 1], merged[i]] = p
+    
+    return [numpy.array([vertices[v] for v in piece]) for piece in pieces.values()]
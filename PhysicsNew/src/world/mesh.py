@@ -1,8 +1,24 @@
-from test.test_decorators import memoize
+from __future__ import absolute_import
 from world.staticObject import StaticObject
 from world.face import Face
+from world.cache import cachedMethod, invalidate
+from world.bvh import BoundingVolumeHierarchy
+from world.meshBuffer import MeshBuffer
 import numpy
-import array
+import hashlib
+import math
+import os
+
+# directory where the topology of meshes is cached between runs, see Mesh._saveTopology
+# None disables the cache
+topologyCacheDir = None
+
+# version of the layout written by Mesh._saveTopology, and of the algorithms that 
+# derive the topology. Change it to keep old cache files from being loaded
+topologyFormat = 1
+
+# boundaries on the same plane up to this tolerance are grouped into the same face
+faceTolerance = 1e-9
         
         
 class Mesh(object):
@@ -16,9 +32,12 @@ class Mesh(object):
     Transformations are the responsibility of the WorldObject, not the mesh itself.
     So, meshes should be defined here 
     '''
-    def __init__(self, dim, boundaries):
+    def __init__(self, dim, boundaries, cacheDir=None):
         '''
         @param boundaries: the boundaries that are on this mesh.
+        @param cacheDir: directory of the topology cache, by default 
+        topologyCacheDir. The topology of a mesh with the same boundary 
+        vertices is loaded from the cache instead of being recomputed.
         '''
         if len(boundaries) == 0:
             raise ValueError("A mesh must contain one or more boundaries!")
@@ -30,15 +49,35 @@ class Mesh(object):
         if not self._checkDimensions():
             raise ValueError("Not all boundaries specified have dimension " + dim + "!")
         
+        # boundaries made one by one keep their vertices in one buffer from now on
+        MeshBuffer.share(boundaries)
+        
+        # moving the vertices of a buffer drops the cached values of this mesh
+        for buffer in self._buffers():
+            buffer.meshes.add(self)
+        
+        if cacheDir is None:
+            cacheDir = topologyCacheDir
+        cachePath = None
+        if cacheDir is not None:
+            cachePath = os.path.join(cacheDir, self._contentHash() + '.npy')
+        
+        if cachePath is not None and os.path.exists(cachePath):
+            self._loadTopology(cachePath)
+            return
+        
         self.neighborMap = self._buildNeighborMap() # map of boundary -> neighboring boundaries
         
         
-        if self._isConnected():
+        if not self._isConnected():
             raise ValueError("Specified mesh is disconnected!")
         
         self.normals = self._calculateNormals()
         
         self.faceMap, self.faces = self._buildFaces() # calculated faces
+        
+        if cachePath is not None:
+            self._saveTopology(cachePath)
     
     def _checkDimensions(self):
         '''
@@ -50,27 +89,101 @@ class Mesh(object):
                 return False
         return True
     
+    def _contentHash(self):
+        '''
+        @return: a hex digest of the dimension and the vertices of all boundaries,
+        in order, along with topologyFormat and faceTolerance. Meshes with the 
+        same digest have the same topology.
+        '''
+        vertices = numpy.array([[boundary.get(k) for k in xrange(self.dim)]
+                                for boundary in self.boundaries], dtype=numpy.float64)
+        header = '%d %d %r ' % (topologyFormat, self.dim, faceTolerance)
+        return hashlib.sha1(header.encode() + vertices.tobytes()).hexdigest()
+    
+    def _saveTopology(self, path):
+        '''
+        Saves the derived topology as a single int32 array, by boundary index:
+        
+        [n, number of neighbor entries, number of faces,
+         neighbor offsets (n + 1), neighbor indices, normal signs (n), face index (n)]
+        
+        The neighbors of boundary i are neighbor indices[offsets[i]:offsets[i+1]].
+        '''
+        index = {b:i for i, b in enumerate(self.boundaries)}
+        faceIndex = {face:k for k, face in enumerate(self.faces)}
+        
+        counts = [len(self.neighborMap[b]) for b in self.boundaries]
+        neighbors = [index[neighbor] for b in self.boundaries for neighbor, edge in self.neighborMap[b]]
+        parts = [[len(self.boundaries), len(neighbors), len(self.faces)],
+                 numpy.cumsum([0] + counts),
+                 neighbors,
+                 [self.normals[b] for b in self.boundaries],
+                 [faceIndex[self.faceMap[b]] for b in self.boundaries]]
+        data = numpy.concatenate([numpy.asarray(part, dtype=numpy.int32) for part in parts])
+        
+        # write to a temporary file first, so other processes never load a partial file
+        tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            numpy.save(f, data)
+        os.rename(tmpPath, path)
+    
+    def _loadTopology(self, path):
+        '''
+        Loads the neighbor map, normals and faces saved by _saveTopology. 
+        The file is memory mapped, and the connections are only rebuilt 
+        for the stored neighbor pairs.
+        '''
+        data = numpy.load(path, mmap_mode='r')
+        n, numNeighbors, numFaces = [int(v) for v in data[:3]]
+        if n != len(self.boundaries):
+            raise ValueError("Topology cache " + path + " does not match this mesh!")
+        
+        offsets = data[3:n+4]
+        neighbors = data[n+4:n+4+numNeighbors]
+        normals = data[n+4+numNeighbors:2*n+4+numNeighbors]
+        faceIndex = data[2*n+4+numNeighbors:3*n+4+numNeighbors]
+        
+        self.neighborMap = {}
+        for i, boundary in enumerate(self.boundaries):
+            neighborList = []
+            for j in neighbors[offsets[i]:offsets[i+1]]:
+                neighbor = self.boundaries[j]
+                neighborList.append((neighbor, boundary.getConnection(neighbor)))
+            self.neighborMap[boundary] = neighborList
+        
+        self.normals = {b:int(sign) for b, sign in zip(self.boundaries, normals)}
+        
+        groups = [[] for k in xrange(numFaces)]
+        for b, k in zip(self.boundaries, faceIndex):
+            groups[k].append(b)
+        self.faceMap, self.faces = self._makeFaces(groups)
+    
     def _buildNeighborMap(self):
         '''
         Here we build the map of neighbors for each face.
-        currently unimplemented, so we have two options
         
-        1. Use a naive O(n^2) algorithm where we check each 
-        boundary against each other (maybe a bad idea)
-        2. Use a set to determine vertices that are relatively
-        close, then we just grab all of the objects inside of the
-        same bucket and check neighbors there (probably better, can eliminate
-        many checks). Can cut cost from n choose 2 to n in the 2d case.
+        Two boundaries can only be connected through a shared vertex (2d)
+        or a shared edge (3d). So we hash every boundary by these keys, and
+        only check the boundaries that land in the same bucket for a 
+        connection. This makes construction linear in the number of
+        boundaries, rather than checking each boundary against each other.
         '''
+        buckets = {} # key -> indices of the boundaries that have the key
+        for i, boundary in enumerate(self.boundaries):
+            for key in self._connectionKeys(boundary):
+                buckets.setdefault(key, []).append(i)
         
         neighborMap={}
         for i, boundary in enumerate(self.boundaries):
-            # create set for each boundary.
-            neighbors = array.array()
+            candidates = set()
+            for key in self._connectionKeys(boundary):
+                candidates.update(buckets[key])
+            candidates.discard(i)
             
-            for j, neighbor in enumerate(self.boundaries):
-                if i == j: 
-                    continue
+            # keep the neighbors in the order of self.boundaries
+            neighbors = []
+            for j in sorted(candidates):
+                neighbor = self.boundaries[j]
                 edge = boundary.getConnection(neighbor)
                 if edge:
                     neighbors.append((neighbor, edge))
@@ -79,6 +192,19 @@ class Mesh(object):
             
         return neighborMap
     
+    def _connectionKeys(self, boundary):
+        '''
+        @param boundary: a boundary on this mesh
+        @return: the hashable keys through which the boundary can connect 
+        to others. These are its vertices in the 2d case, and its edges 
+        (unordered pairs of vertices) in the 3d case.
+        '''
+        vertices = [tuple(boundary.get(k)) for k in xrange(self.dim)]
+        if self.dim == 2:
+            return vertices
+        return [frozenset((vertices[a], vertices[b]))
+                for a in xrange(self.dim) for b in xrange(a+1, self.dim)]
+    
     def _isConnected(self):
         '''
         Tests the connectivity of this mesh. We might have a mesh
@@ -90,28 +216,25 @@ class Mesh(object):
         visited = set()
         frontier = [self.boundaries[0]]
         
-        while True:
+        while frontier:
             next = frontier.pop()
             if next in visited:
                 continue
             visited.add(next)
             for neighbor, edge in self.neighborMap[next]:
                 frontier.append(neighbor)
-            
-            if len(frontier) == 0:
-                break
         
         # we should have visited each boundary. Otherwise we 
         # have a connection problem, housten!
         return len(visited) == len(self.boundaries)
     
-    @memoize
+    @cachedMethod
     def isClosed(self):
         '''
         @return: True iff this mesh is a closed surface.
         '''
-        for boundary, neighbors in self.neighborMap:
-            #need dim neighbors
+        for boundary, neighbors in self.neighborMap.iteritems():
+            # need dim neighbors, one across each vertex (2d) or edge (3d)
             
             if len(neighbors) != self.dim:
                 return False
@@ -171,7 +294,7 @@ class Mesh(object):
             normals[boundary] *= -1 # flip using sign
             return
         
-        while True:
+        while frontier:
             next = frontier.pop()
             if next in visited:
                 continue
@@ -187,21 +310,162 @@ class Mesh(object):
                 flipBoundary(next)
                 
             visited.add(next)
-            if len(frontier) == 0:
-                break
+            for (neighbor, edge) in self.neighborMap[next]:
+                if neighbor not in visited:
+                    frontier.append(neighbor)
             
         return normals
     
-    @memoize
     def volume(self):
         if not self.isClosed():
             raise RuntimeError("Cannot find the volume on a non-closed mesh")
-        volume = 0.0
-        for norm, b in zip(self.normals, self.boundaries):
-            #carved volume with respect to the origin
-            volume = volume + norm * b.carvedVolume()
-            
-        return volume
+        return self.massProperties()[0]
+    
+    @cachedMethod
+    def massProperties(self):
+        '''
+        Volume, centroid and inertia of the solid enclosed by this mesh, for 
+        unit density. Each boundary forms a signed simplex with the origin 
+        (a tetrahedron in 3d, a triangle in 2d), see Boundary.carvedVolume, 
+        and we sum the moments of all simplices at once.
+        
+        The result is computed once and cached on the mesh, see invalidateCaches.
+        
+        @return: volume, centroid, inertia. In the 3d case, inertia is the 
+        (3, 3) inertia tensor about the centroid. In the 2d case, it is the 
+        moment of inertia about the axis through the centroid normal to the 
+        plane. Multiply volume and inertia by the density to get the mass and 
+        inertia of a material.
+        @requires: self.isClosed()
+        '''
+        dim = self.dim
+        corners = self._corners() # (F, dim, dim)
+        
+        # twice (2d) or six times (3d) the signed volume of each simplex,
+        # flipped where the boundary normal is flipped
+        if dim == 2:
+            det = corners[:, 0, 0] * corners[:, 1, 1] - corners[:, 0, 1] * corners[:, 1, 0]
+        else:
+            det = numpy.einsum('ij,ij->i', corners[:, 0], numpy.cross(corners[:, 1], corners[:, 2]))
+        det *= numpy.array([self.normals[b] for b in self.boundaries], dtype=numpy.float64)
+        
+        volume = det.sum() / math.factorial(dim)
+        if volume < 0: # consistent normals, but all facing inwards
+            det = -det
+            volume = -volume
+        
+        # the simplex with vertices 0, v_1 ... v_dim has its centroid at sum(v_k) / (dim + 1) 
+        # and second moment \int x x^T dV = det / (dim + 2)! * (sum_k v_k v_k^T + sum(v_k) sum(v_k)^T)
+        total = corners.sum(axis=1)
+        centroid = numpy.einsum('i,ij->j', det, total) / (math.factorial(dim) * (dim + 1) * volume)
+        secondMoment = (numpy.einsum('i,ikj,ikl->jl', det, corners, corners)
+                        + numpy.einsum('i,ij,il->jl', det, total, total)) / math.factorial(dim + 2)
+        secondMoment -= volume * numpy.outer(centroid, centroid) # move to the centroid
+        
+        if dim == 2:
+            inertia = numpy.trace(secondMoment)
+        else:
+            inertia = numpy.trace(secondMoment) * numpy.eye(3) - secondMoment
+        
+        return volume, centroid, inertia
+    
+    @cachedMethod
+    def _faceHalfSpaces(self):
+        '''
+        @return: A, b, pieceStart, faceStart. The Face.meshHalfSpaces of all
+        faces stacked, where face k is made up of the pieces 
+        faceStart[k]:faceStart[k + 1].
+        '''
+        rows = [face.meshHalfSpaces() for face in self.faces]
+        rowStart = numpy.cumsum([0] + [len(b) for A, b, starts in rows[:-1]])
+        pieceStart = numpy.concatenate([starts + offset for (A, b, starts), offset in zip(rows, rowStart)])
+        faceStart = numpy.cumsum([0] + [len(starts) for A, b, starts in rows[:-1]])
+        return (numpy.concatenate([A for A, b, starts in rows]),
+                numpy.concatenate([b for A, b, starts in rows]), pieceStart, faceStart)
+    
+    def facesContaining(self, point, tolerance=1e-9):
+        '''
+        Tests point against the half spaces of all faces at once, see 
+        Face.halfSpaces.
+        @param point: a point in mesh coordinates
+        @param tolerance: the distance a point may be off a face and still be on it
+        @return: the faces that point lies on
+        '''
+        A, b, pieceStart, faceStart = self._faceHalfSpaces()
+        inside = numpy.dot(A, point) <= b + tolerance
+        onFace = numpy.logical_or.reduceat(numpy.logical_and.reduceat(inside, pieceStart), faceStart)
+        return [self.faces[k] for k in numpy.flatnonzero(onFace)]
+    
+    @cachedMethod
+    def hierarchy(self):
+        '''
+        @return: a BoundingVolumeHierarchy over the boundaries of this mesh, in
+        mesh coordinates. Boundary i of the hierarchy is self.boundaries[i].
+        '''
+        return BoundingVolumeHierarchy(self._corners())
+    
+    def worldHierarchy(self, hierarchy, pos, rot):
+        '''
+        Places a hierarchy of this mesh at pos and rot, for collision queries 
+        in world coordinates. The tree is built once, moving the mesh only 
+        refits its boxes, and only if the pose has changed since the last call.
+        @param hierarchy: a copy of self.hierarchy(), owned by the world object
+        that places this mesh, see collisionHierarchy
+        @param pos: the translation of the mesh
+        @param rot: (dim, dim) rotation matrix of the mesh
+        @return: hierarchy, refit to the given pose
+        '''
+        pos = numpy.asarray(pos, dtype=numpy.float64)
+        rot = numpy.asarray(rot, dtype=numpy.float64)
+        pose = (pos.tostring(), rot.tostring())
+        if hierarchy.pose != pose:
+            hierarchy.refit(numpy.einsum('fki,ji->fkj', self._corners(), rot) + pos)
+            hierarchy.pose = pose
+        return hierarchy
+    
+    @cachedMethod
+    def _collisionHierarchy(self):
+        '''
+        @return: the copy of the hierarchy of this mesh that collisionHierarchy
+        refits, dropped along with the other caches of the mesh
+        '''
+        return self.hierarchy().copy()
+    
+    def collisionHierarchy(self):
+        '''
+        @return: the hierarchy of this mesh at its current pos and rot, see
+        worldHierarchy. Only for meshes that are world objects with a pos and 
+        rot, i.e. StaticMesh, DynamicMesh and MovableMesh.
+        '''
+        return self.worldHierarchy(self._collisionHierarchy(), self.pos, self.rot)
+    
+    def invalidateCaches(self):
+        '''
+        Drops the cached values of this mesh, its faces and the buffers of its 
+        boundaries. MeshBuffer.setVertices calls this when a dynamic mesh deforms.
+        The topology of the mesh is kept.
+        '''
+        invalidate(self)
+        for face in self.faces:
+            invalidate(face)
+        for buffer in self._buffers():
+            invalidate(buffer)
+    
+    def _buffers(self):
+        '''
+        @return: the distinct MeshBuffers that hold the boundaries of this mesh
+        '''
+        return set(b.buffer for b in self.boundaries)
+    
+    def _corners(self):
+        '''
+        @return: (F, dim, dim) array of the vertices of every boundary, in the
+        order of self.boundaries
+        '''
+        buffer = self.boundaries[0].buffer
+        if all(b.buffer is buffer for b in self.boundaries):
+            return buffer.vertices[buffer.indices[[b.index for b in self.boundaries]]]
+        return numpy.array([[b.get(k) for k in xrange(self.dim)] for b in self.boundaries])
         
     def getFaces(self):
         return self.faces
@@ -209,37 +473,82 @@ class Mesh(object):
     def getFaceMap(self):
         return self.faceMap
     
-    def _buildFaces(self):
+    def _buildFaces(self, tolerance=None):
         '''
-        Construct faces. Here, we run a DFS from each boundary, and stop traversing the 
-        DFS when we meet another boundary that is not parallel to this one.
+        Construct faces. Adjacent boundaries belong to the same face iff they lie 
+        in the same plane (3d) or on the same line (2d), up to tolerance. 
+        
+        The plane of a boundary is its unit normal, oriented by self.normals, and 
+        its offset from the origin relative to the size of the mesh, so the result
+        does not depend on the scale of the mesh. Adjacent boundaries are joined 
+        in a union-find, which takes near-linear time. Every group keeps the 
+        range of the planes of its boundaries, and two groups are only joined if
+        their joint range stays within tolerance. So the planes of any two 
+        boundaries of a face differ by at most tolerance, and the normals cannot 
+        drift across a face on a finely tessellated curved surface.
         
+        @param tolerance: by default faceTolerance
         @return: faceMap, faces. faceMap is a map that goes from boundary -> face, such
         that faceMap[boundary] is the face that the specified boundary belongs to. faces
         represents all faces that are present inside of this mesh.
         '''
-        # construct the faces for the boundary.
+        if tolerance is None:
+            tolerance = faceTolerance
+        n = len(self.boundaries)
+        index = {b:i for i, b in enumerate(self.boundaries)}
+        
+        corners = self._corners()
+        normals = numpy.array([self.normals[b] * numpy.asarray(b.norm()) for b in self.boundaries])
+        offsets = numpy.einsum('ij,ij->i', normals, corners[:, 0]) / max(1.0, numpy.abs(corners).max())
+        planes = numpy.column_stack([normals, offsets])
+        
+        # every adjacent pair once, whose planes agree
+        pairs = numpy.array([(i, index[neighbor]) for i, boundary in enumerate(self.boundaries)
+                             for neighbor, edge in self.neighborMap[boundary]], dtype=numpy.intp).reshape(-1, 2)
+        pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+        pairs = pairs[numpy.abs(planes[pairs[:, 0]] - planes[pairs[:, 1]]).max(axis=1) <= tolerance]
+        
+        parent = list(xrange(n))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]] # path halving
+                i = parent[i]
+            return i
+        
+        lo, hi = planes.copy(), planes.copy() # range of the planes in each group, by root
+        for i, j in pairs.tolist():
+            rooti, rootj = find(i), find(j)
+            if rooti == rootj:
+                continue
+            groupLo = numpy.minimum(lo[rooti], lo[rootj])
+            groupHi = numpy.maximum(hi[rooti], hi[rootj])
+            if (groupHi - groupLo).max() <= tolerance:
+                root = min(rooti, rootj)
+                parent[max(rooti, rootj)] = root
+                lo[root], hi[root] = groupLo, groupHi
+        
         # at least four (tetrahedron), at most len(boundaries) (none are parallel and adjacent)
+        groups = []
+        groupIndex = {} # root -> index in groups
+        for i, boundary in enumerate(self.boundaries):
+            root = find(i)
+            if root not in groupIndex:
+                groupIndex[root] = len(groups)
+                groups.append([])
+            groups[groupIndex[root]].append(boundary)
+        return self._makeFaces(groups, tolerance)
+    
+    def _makeFaces(self, groups, tolerance=None):
+        '''
+        @param groups: a list of boundary lists, one for each face
+        @param tolerance: see Face, by default faceTolerance
+        @return: faceMap, faces as in _buildFaces
+        '''
         faces = []
         faceMap = {}
-        visited = set()
-        for boundary in self.boundaries:
-            if boundary in visited:
-                continue
-            frontier = [boundary]
-            faceBoundaries = []
-            while True:
-                next = frontier.pop()
-                if next in visited:
-                    continue
-                visited.add(next)
-                faceBoundaries.append(next)
-                for neighbor, edge in self.neighborMap[boundary]:
-                    if next.isParallel(neighbor):
-                        frontier.append(neighbor)
-                if len(frontier) == 0:
-                    break
-            face = Face(self.dim, faceBoundaries, self.boundaryMap)
+        for faceBoundaries in groups:
+            face = Face(self.dim, faceBoundaries, self.neighborMap,
+                        faceTolerance if tolerance is None else tolerance)
             faces.append(face)
             for b in faceBoundaries:
                 faceMap[b] = face
@@ -261,4 +570,17 @@ def calculateDensity(mass, mesh):
     '''
     Calculate the density of a mesh given its mass
     '''
-    return mass / mesh.volume()
\ No newline at end of file
+    return mass / mesh.volume()
+
+def calculateCenterOfMass(mesh):
+    '''
+    Calculate the center of mass of a mesh of uniform density
+    '''
+    return mesh.massProperties()[1]
+
+def calculateInertia(density, mesh):
+    '''
+    Calculate the inertia of a mesh about its center of mass given its density
+    (see Mesh.massProperties)
+    '''
+    return mesh.massProperties()[2] * density
\ No newline at end of file
@@ -0,0 +1,134 @@
+'''
+Array-backed storage for the boundaries of a mesh.
+
+Rather than keeping separate vertex arrays in every boundary object, all
+boundaries of a mesh share a single vertex array. Boundary2D and Boundary3D
+objects created with Boundary.fromBuffer are thin views into it. Boundaries
+created with their own constructors are moved into a shared buffer when a
+mesh is made of them, see MeshBuffer.share.
+'''
+from __future__ import absolute_import
+import numpy
+import weakref
+from world.cache import cachedMethod, invalidate
+
+class MeshBuffer(object):
+    '''
+    The boundaries of a mesh as a deduplicated (V, dim) vertex array and an
+    (F, dim) index array, such that vertices[indices[i]] are the vertices of
+    boundary i. Normals and areas of all boundaries are precomputed in bulk.
+
+    In the 2d case a boundary is a line segment and its area is its length.
+    In the 3d case a boundary is a triangle.
+    '''
+    def __init__(self, vertices, indices):
+        '''
+        @param vertices: (V, dim) array of distinct vertices
+        @param indices: (F, dim) integer array, the vertex indices of each boundary
+        '''
+        self.vertices = numpy.array(vertices, dtype=numpy.float64)
+        self.indices = numpy.array(indices, dtype=numpy.intp)
+        self.dim = self.vertices.shape[1]
+
+        if self.dim not in [2, 3]:
+            raise ValueError("Invalid dimension value \"" + str(self.dim) + "\", only 2 or 3 allowed.")
+        if self.indices.ndim != 2 or self.indices.shape[1] != self.dim:
+            raise ValueError("Expected an index array of shape (F, " + str(self.dim) + ")")
+
+        self._computeGeometry()
+        # the meshes made of boundaries in this buffer, see Mesh.invalidateCaches
+        self.meshes = weakref.WeakSet()
+
+    def _computeGeometry(self):
+        corners = self.corners()
+        if self.dim == 2:
+            vec = corners[:, 1] - corners[:, 0]
+            normals = numpy.column_stack([-vec[:, 1], vec[:, 0]])
+        else:
+            normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        lengths = numpy.sqrt(numpy.einsum('ij,ij->i', normals, normals))
+
+        if numpy.any(lengths == 0):
+            raise ValueError("Error: boundary " + str(numpy.flatnonzero(lengths == 0)[0]) + " has zero area")
+
+        self.normals = normals / lengths[:, numpy.newaxis] # unit normals, (F, dim)
+        self.areas = lengths if self.dim == 2 else lengths / 2.0 # (F,)
+
+    def setVertices(self, vertices):
+        '''
+        Moves the vertices, keeping the indices. Normals and areas are recomputed,
+        and the cached values of this buffer and of the meshes on it are dropped.
+        @param vertices: (V, dim) array, the new position of every vertex
+        '''
+        vertices = numpy.array(vertices, dtype=numpy.float64)
+        if vertices.shape != self.vertices.shape:
+            raise ValueError("Expected a vertex array of shape " + str(self.vertices.shape))
+        self.vertices = vertices
+        self._computeGeometry()
+        invalidate(self)
+        for mesh in list(self.meshes):
+            mesh.invalidateCaches()
+
+    @classmethod
+    def fromCorners(cls, corners):
+        '''
+        @param corners: (F, dim, dim) array, such that corners[i] are the vertices
+        of boundary i.
+        @return: a MeshBuffer where equal vertices are stored once
+        '''
+        corners = numpy.asarray(corners, dtype=numpy.float64)
+        numBoundaries, dim = corners.shape[:2]
+        vertices, inverse = numpy.unique(corners.reshape(numBoundaries * dim, dim),
+                                         axis=0, return_inverse=True)
+        return cls(vertices, inverse.reshape(numBoundaries, dim))
+
+    @classmethod
+    def share(cls, boundaries):
+        '''
+        Moves the boundaries that have a buffer of their own, i.e. the ones made with
+        the Boundary2D and Boundary3D constructors, into one new buffer where equal 
+        vertices are stored once. Their old buffers are dropped. Boundaries that are 
+        views of a larger buffer, or that are already on a mesh, are left alone.
+        @param boundaries: the boundaries of a mesh
+        @return: the new buffer, or None if there was nothing to share
+        '''
+        alone = [b for b in boundaries if len(b.buffer) == 1 and len(b.buffer.meshes) == 0]
+        if len(alone) < 2:
+            return None
+        buffer = cls.fromCorners([b.buffer.corners()[0] for b in alone])
+        for (i, boundary) in enumerate(alone):
+            boundary.buffer = buffer
+            boundary.index = i
+        return buffer
+
+    def __len__(self):
+        return len(self.indices)
+
+    def corners(self):
+        '''
+        @return: (F, dim, dim) array of the vertices of every boundary
+        '''
+        return self.vertices[self.indices]
+
+    @cachedMethod
+    def carvedVolumes(self):
+        '''
+        @return: the carvedVolume of every boundary (see Boundary.carvedVolume),
+        as an (F,) array
+        '''
+        corners = self.corners()
+        pos = corners[:, 0]
+        side = numpy.sign(numpy.einsum('ij,ij->i', pos, self.normals))
+        if self.dim == 2:
+            vec = corners[:, 1] - pos
+            return side * numpy.abs(pos[:, 0] * vec[:, 1] - pos[:, 1] * vec[:, 0]) / 2
+        cross = numpy.cross(corners[:, 1] - pos, corners[:, 2] - pos)
+        return side * numpy.einsum('ij,ij->i', pos, cross) / 6.0
+
+    def boundaries(self):
+        '''
+        @return: a list of boundary views, one for each boundary in this buffer
+        '''
+        from world.boundary import Boundary2D, Boundary3D
+        cls = Boundary2D if self.dim == 2 else Boundary3D
+        return [cls.fromBuffer(self, i) for i in xrange(len(self))]
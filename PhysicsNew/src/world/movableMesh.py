@@ -1,7 +1,16 @@
+from __future__ import absolute_import
 from world.movableObject import MovableObject
 from world.mesh import Mesh
 
 class MovableMesh(MovableObject, Mesh):
 
-    def __init__(self, boundaries, dim, pos, rot, mass):    
-        return
\ No newline at end of file
+    def __init__(self, boundaries, dim, pos, rot, mass):
+        '''
+        @param boundaries: the boundaries for this movable mesh
+        @param pos: the initial translation of this mesh
+        @param rot: the initial position of this mesh
+        @param mass: the mass of this mesh
+        '''
+        MovableObject.__init__(self, dim, pos, mass)
+        Mesh.__init__(self, dim, boundaries)
+        self.rot = rot.copy()
@@ -1,7 +1,8 @@
+from __future__ import absolute_import
 from world.dynamicObject import DynamicObject
 
 class MovableObject(DynamicObject):
     '''Represents an object that can be moved by the client.'''
     def __init__(self, dim, pos, mass):
-        super(DynamicObject, self).__init__(dim, pos, mass)
+        super(MovableObject, self).__init__(dim, pos, mass)
         return
\ No newline at end of file
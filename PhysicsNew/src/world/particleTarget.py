@@ -1,3 +1,4 @@
+from __future__ import absolute_import
 from world.targetObject import MovableObject
 from world.particle import Particle
 
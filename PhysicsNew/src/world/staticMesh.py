@@ -1,9 +1,10 @@
+from __future__ import absolute_import
 from world.staticObject import StaticObject
 from world.mesh import Mesh
 
 class StaticMesh(StaticObject, Mesh):
     def __init__(self, dim, boundaries, pos, rot):
-        super(StaticObject, self).__init__(dim, pos)
-        super(Mesh, self).__init__(dim, boundaries)
+        StaticObject.__init__(self, dim, pos)
+        Mesh.__init__(self, dim, boundaries)
         self.rot = rot
-        return
\ No newline at end of file
+        return
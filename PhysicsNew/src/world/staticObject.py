@@ -1,3 +1,4 @@
+from __future__ import absolute_import
 from world.worldObject import WorldObject
 
 class StaticObject(WorldObject):
@@ -6,6 +7,6 @@ class StaticObject(WorldObject):
     Massless.
     '''
     def __init__(self, dim, pos):
-        super(WorldObject, self).__init__(dim, pos)
+        super(StaticObject, self).__init__(dim, pos)
     
     
\ No newline at end of file
@@ -1,3 +1,4 @@
+from __future__ import absolute_import
 from world.dynamicObject import DynamicObject
 from world.worldObject import WorldObject
 
@@ -325,31 +325,68 @@ else:
 
 import time  # not really essential
 import collections
+import os
+import atexit
+import threading
+import weakref
+try:
+    import queue
+except ImportError:  # in python 2
+    import Queue as queue
 import numpy as np
 # arange, cos, size, eye, inf, dot, floor, outer, zeros, linalg.eigh,
 # sort, argsort, random, ones,...
 from numpy import inf, array, dot, exp, log, sqrt, sum, isscalar, isfinite
 # to access the built-in sum fct:  ``__builtins__.sum`` or ``del sum``
 # removes the imported sum and recovers the shadowed build-in
-try:
-    from matplotlib import pyplot
-    savefig = pyplot.savefig  # now we can use cma.savefig() etc
-    closefig = pyplot.close
-    def show():
-        # is_interactive = matplotlib.is_interactive()
-        pyplot.ion()
-        pyplot.show()
-        # if we call now matplotlib.interactive(True), the console is
-        # blocked
-    pyplot.ion()  # prevents that execution stops after plotting
-except:
-    pyplot = None
-    savefig = None
-    closefig = None
-    def show():
+class _LazyPyplot(object):
+    """stand-in for module `matplotlib.pyplot`, imported on first use.
+
+    Importing `matplotlib.pyplot` takes most of the time of importing
+    this module, while for example an optimizer in a worker process
+    never plots. The instance is ``False`` in a boolean context if
+    `matplotlib.pyplot` cannot be imported.
+
+    """
+    def __init__(self):
+        self._module = None
+        self._failed = False
+    def _load(self):
+        if self._module is None and not self._failed:
+            try:
+                from matplotlib import pyplot as module
+                module.ion()  # prevents that execution stops after plotting
+                self._module = module
+            except:
+                self._failed = True
+                print('Could not import matplotlib.pyplot, therefore ``cma.plot()``" +'
+                      ' etc. is not available')
+        return self._module
+    def __getattr__(self, name):
+        module = self._load()
+        if module is None:
+            raise AttributeError('matplotlib.pyplot is not available, '
+                                 + 'attribute %s not found' % name)
+        return getattr(module, name)
+    def __bool__(self):
+        return self._load() is not None
+    __nonzero__ = __bool__  # in python 2
+pyplot = _LazyPyplot()
+def savefig(*args, **kwargs):
+    """`matplotlib.pyplot.savefig`, now we can use cma.savefig() etc"""
+    return pyplot.savefig(*args, **kwargs)
+def closefig(*args, **kwargs):
+    """`matplotlib.pyplot.close`"""
+    return pyplot.close(*args, **kwargs)
+def show():
+    if not pyplot:
         print('pyplot.show() is not available')
-    print('Could not import matplotlib.pyplot, therefore ``cma.plot()``" +'
-          ' etc. is not available')
+        return
+    # is_interactive = matplotlib.is_interactive()
+    pyplot.ion()
+    pyplot.show()
+    # if we call now matplotlib.interactive(True), the console is
+    # blocked
 
 __author__ = 'Nikolaus Hansen'
 __version__ = "1.1.06  $Revision: 4129 $ $Date: 2015-01-23 20:13:51 +0100 (Fri, 23 Jan 2015) $"
@@ -530,6 +567,42 @@ def is_feasible(x, f):
     """default to check feasibility, see also ``cma_default_options``"""
     return f is not None and f is not np.NaN
 
+def vectorized_objective(fun):
+    """mark `fun` as vectorized objective function and return it.
+
+    A vectorized ``fun(X, *args)`` takes a 2-D array ``X`` with one
+    candidate solution per row and returns ``len(X)`` function values.
+    `fmin`, `OOOptimizer.optimize`, `CMAEvolutionStrategy.ask_and_eval`
+    and `NoiseHandler` then evaluate all solutions with a single call::
+
+        import cma
+        @cma.vectorized_objective
+        def sphere(X):
+            return (X**2).sum(axis=1)
+        es = cma.CMAEvolutionStrategy(10 * [1], 1).optimize(sphere)
+
+    """
+    fun.vectorized = True
+    return fun
+
+def is_vectorized(fun):
+    """return whether `fun` was marked with `vectorized_objective`"""
+    return getattr(fun, 'vectorized', False) is True
+
+def _evaluate_all(fun, X, args=()):
+    """return the list of ``fun(x, *args)`` for all ``x`` in `X`, with
+    a single call if `fun` is vectorized"""
+    if not is_vectorized(fun):
+        return [fun(x, *args) for x in X]
+    if not len(X):
+        return []
+    f = fun(array(X, dtype=float), *args)
+    f = [f] if isscalar(f) else list(f)
+    if len(f) != len(X):
+        raise _Error('vectorized objective function returned %d values for %d solutions'
+                     % (len(f), len(X)))
+    return f
+
 global_verbosity = 1
 def _print_warning(msg, method_name=None, class_name=None, iteration=None,
                    verbose=None):
@@ -1450,12 +1523,17 @@ class BoxConstraintsLinQuadTransformation(BoxConstraintsTransformationBase):
         # about four times faster version of array([self._transform_i(x, i) for i, x in enumerate(solution_genotype)])
         # still, this makes a typical run on a test function two times slower, but there might be one too many copies
         # during the transformations in gp
-        if len(self._lb) != len(solution_genotype):
-            self.initialize(len(solution_genotype))
+        # a 2-D array is transformed row-wise, the bounds are tiled over the rows
+        N = np.shape(solution_genotype)[-1]
+        if len(self._lb) != N:
+            self.initialize(N)
         lb = self._lb
         ub = self._ub
         al = self._al
         au = self._au
+        if np.ndim(solution_genotype) == 2:
+            lb, ub, al, au = [np.tile(v, (len(solution_genotype), 1))
+                              for v in (lb, ub, al, au)]
 
         if copy_always or not isinstance(solution_genotype[0], float):
             # transformed value is likely to be a float
@@ -1759,6 +1837,9 @@ class GenoPheno(object):
         -------
         If ``copy``, values from ``x`` are copied if changed under the transformation.
 
+        ``x`` can also be a 2-D array with one solution per row, then
+        all transformations are applied to the whole matrix at once.
+
         """
         # TODO: copy_always seems superfluous, as it could be done in the calling code
         input_type = type(x)
@@ -1777,6 +1858,11 @@ class GenoPheno(object):
         else:
             if self.fixed_values is None:
                 y = array(x, copy=copy)  # make a copy, in case
+            elif np.ndim(x) == 2:  # expand all rows with fixed values
+                keys = sorted(self.fixed_values.keys())
+                y = np.insert(array(x, dtype=float),
+                              [k - j for j, k in enumerate(keys)],
+                              [self.fixed_values[k] for k in keys], axis=1)
             else:  # expand with fixed values
                 y = list(x)  # is a copy
                 for i in sorted(self.fixed_values.keys()):
@@ -1791,13 +1877,16 @@ class GenoPheno(object):
                 y += self.typical_x
 
             if self.tf_pheno is not None:
-                y = array(self.tf_pheno(y), copy=False)
+                if np.ndim(y) == 2:
+                    y = array([self.tf_pheno(yi) for yi in y], copy=False)
+                else:
+                    y = array(self.tf_pheno(y), copy=False)
 
             y = into_bounds(y, copy)  # copy is False
 
             if self.fixed_values is not None:
                 for i, k in list(self.fixed_values.items()):
-                    y[i] = k
+                    y[..., i] = k
 
         if input_type is np.ndarray:
             y = array(y, copy=False)
@@ -2017,7 +2106,8 @@ class OOOptimizer(object):
         ---------
 
             `objective_fct`
-                function be to minimized
+                function be to minimized, called once per iteration
+                with all solutions if marked with `vectorized_objective`
             `iterations`
                 number of (maximal) iterations, while ``not self.stop()``
             `min_iterations`
@@ -2076,7 +2166,7 @@ class OOOptimizer(object):
             citer += 1
 
             X = self.ask()  # deliver candidate solutions
-            fitvals = [objective_fct(x, *args) for x in X]
+            fitvals = _evaluate_all(objective_fct, X, args)
             self.tell(X, fitvals)  # all the work is done here
             self.disp(verb_disp)
             for f in call_back:
@@ -2883,6 +2973,11 @@ class CMAEvolutionStrategy(OOOptimizer):
         self._flgtelldone = True
         self.itereigenupdated = self.countiter
         self.count_eigen = 0
+        self._BD = None  # cache of B * D for sampling, reset whenever B or D change
+        self.timer_eigen = 0.  # seconds spent in updateBD
+        self.timer_eigen_last = 0.  # seconds spent in the last call of updateBD
+        self.timer_evals_since_eigen = 0.  # seconds spent outside of ask and tell since the last updateBD
+        self._time_last_ask = None
         self.noiseS = 0  # noise "signal"
         self.hsiglist = []
 
@@ -2894,13 +2989,15 @@ class CMAEvolutionStrategy(OOOptimizer):
         np.random.seed(opts['seed'])  # CAVEAT: this only seeds np.random
 
         self.sent_solutions = CMASolutionDict()
+        self._vectorized_pop = None  # (pheno list, geno array, iteration) of a vectorized ask
         self.archive = CMASolutionDict()
         self.best = BestSolution()
 
         self.const = _BlancClass()
         self.const.chiN = N**0.5 * (1 - 1. / (4.*N) + 1. / (21.*N**2))  # expectation of norm(randn(N,1))
 
-        self.logger = CMADataLogger(opts['verb_filenameprefix'], modulo=opts['verb_log']).register(self)
+        self.logger = (CMADataLoggerBinary if opts['verb_log_binary'] else CMADataLogger)(
+            opts['verb_filenameprefix'], modulo=opts['verb_log']).register(self)
 
         # attribute for stopping criteria in function stop
         self._stopdict = _CMAStopDict()
@@ -2994,8 +3091,18 @@ class CMAEvolutionStrategy(OOOptimizer):
         :See: `ask_and_eval`, `ask_geno`, `tell`
 
         """
+        self._flush_vectorized()
         pop_geno = self.ask_geno(number, xmean, sigma_fac)
 
+        if (self.opts['vectorized'] and gradf is None and
+                not isinstance(self.boundary_handler, BoundPenalty)):
+            # transform the population as one matrix, the genotypes are
+            # kept for `tell` instead of inserting each into sent_solutions
+            pop_pheno = list(self.gp.pheno(pop_geno, copy=True,
+                                           into_bounds=self.boundary_handler.repair))
+            self._vectorized_pop = (tuple(pop_pheno), pop_geno, self.countiter)  # the list may be consumed
+            return pop_pheno
+
         # N,lambda=20,200: overall CPU 7s vs 5s == 40% overhead, even without bounds!
         #                  new data: 11.5s vs 9.5s == 20%
         # TODO: check here, whether this is necessary?
@@ -3123,21 +3230,12 @@ class CMAEvolutionStrategy(OOOptimizer):
             number = self.sp.popsize
 
         # update distribution, might change self.mean
-        if self.sp.CMA_on and (
-                (self.opts['updatecovwait'] is None and
-                 self.countiter >=
-                     self.itereigenupdated + 1. / (self.sp.c1 + self.sp.cmu) / self.N / 10
-                 ) or
-                (self.opts['updatecovwait'] is not None and
-                 self.countiter > self.itereigenupdated + self.opts['updatecovwait']
-                 ) or
-                (self.sp.neg.cmuexp * (self.countiter - self.itereigenupdated) > 0.5
-                )  # TODO (minor): not sure whether this is "the right" criterion
-            ):
+        if self.sp.CMA_on and self._updateBD_is_due():
             self.updateBD()
         if xmean is None:
             xmean = self.mean
         else:
+            self._flush_vectorized()
             try:
                 xmean = self.archive[xmean]['geno']
                 # noise handling after call of tell
@@ -3192,11 +3290,8 @@ class CMAEvolutionStrategy(OOOptimizer):
         # the 1 is a small safeguard which needs to be removed to implement "pure" adaptive encoding
         arz = self.randn((max([1, (number - len(arinj))]), self.N))
         if self.opts['CMA_sample_on_sphere_surface']:  # normalize the length to chiN
-            for i in rglen((arz)):
-                ss = sum(arz[i]**2)
-                if 1 < 3 or ss > self.N + 10.1:
-                    arz[i] *= (self.N**0.5 if self.opts['CSA_squared']
-                                           else self.const.chiN) / ss**0.5
+            arz *= (self.N**0.5 if self.opts['CSA_squared'] else self.const.chiN) \
+                   / sum(arz**2, 1)[:, None]**0.5
             # or to average
             # arz *= 1 * self.const.chiN / np.mean([sum(z**2)**0.5 for z in arz])
 
@@ -3215,7 +3310,13 @@ class CMAEvolutionStrategy(OOOptimizer):
                                             % (i, self.sp.lam_mirr))
                         break
                     arz[-1 - 2 * i] = -arz[-2 - 2 * i]
-            ary = self.sigma_vec * np.dot(self.B, (self.D * arz).T).T
+            if self.B.ndim == 2:
+                # one matrix product with the cached B * D instead of B * (D * z)
+                if getattr(self, '_BD', None) is None:
+                    self._BD = self.B * self.D
+                ary = self.sigma_vec * np.dot(arz, self._BD.T)
+            else:  # diagonal case, B is a scalar 1
+                ary = self.sigma_vec * self.D * arz
             if len(arinj):
                 ary = np.vstack((arinj, ary))
         else:
@@ -3250,8 +3351,48 @@ class CMAEvolutionStrategy(OOOptimizer):
         pop = xmean + sigma * ary
         self.evaluations_per_f_value = 1
         self.ary = ary
+        self._time_last_ask = time.time()
         return pop
 
+    def _flush_vectorized(self):
+        """insert the solutions of the last vectorized `ask` into
+        ``sent_solutions``, which is only needed when they are used
+        otherwise than passed unchanged to `tell`.
+
+        """
+        if self._vectorized_pop is not None:
+            pop_pheno, pop_geno, iteration = self._vectorized_pop
+            self._vectorized_pop = None
+            for i in rglen(pop_pheno):
+                self.sent_solutions.insert(pop_pheno[i], geno=pop_geno[i],
+                                           iteration=iteration)
+
+    def _updateBD_is_due(self):
+        """return whether `ask_geno` should call `updateBD` now.
+
+        By default, the eigendecomposition is postponed by
+        ``1 / (c1 + cmu) / N / 10`` iterations, or by ``updatecovwait``
+        iterations if set. With option ``CMA_eigen_timefrac``, it is
+        postponed further, until the measured time of the last
+        `updateBD` is at most ``CMA_eigen_timefrac`` times the time
+        spent in evaluations since, but no longer than
+        ``CMA_eigen_maxwait`` times the default waiting time.
+
+        """
+        waited = self.countiter - self.itereigenupdated
+        # TODO (minor): not sure whether this is "the right" criterion
+        if self.sp.neg.cmuexp * waited > 0.5:
+            return True
+        if self.opts['updatecovwait'] is not None:
+            return waited > self.opts['updatecovwait']
+        default_wait = 1. / (self.sp.c1 + self.sp.cmu) / self.N / 10
+        if waited < default_wait:
+            return False
+        timefrac = self.opts['CMA_eigen_timefrac']
+        if timefrac is None or waited >= self.opts['CMA_eigen_maxwait'] * default_wait:
+            return True
+        return self.timer_eigen_last <= timefrac * self.timer_evals_since_eigen
+
     def random_rescale_to_mahalanobis(self, x):
         """change `x` like for injection, all on genotypic level"""
         x -= self.mean
@@ -3298,6 +3439,7 @@ class CMAEvolutionStrategy(OOOptimizer):
         mirrors that must be clearly suboptimal.
 
         """
+        self._flush_vectorized()
         try:
             dx = self.sent_solutions[x]['geno'] - self.mean
         except:  # can only happen with injected solutions?!
@@ -3376,7 +3518,9 @@ class CMAEvolutionStrategy(OOOptimizer):
         Arguments
         ---------
             `func`
-                objective function, ``func(x)`` returns a scalar
+                objective function, ``func(x)`` returns a scalar, or a
+                function marked with `vectorized_objective` that is
+                called with all solutions at once
             `args`
                 additional parameters for `func`
             `gradf`
@@ -3459,6 +3603,36 @@ class CMAEvolutionStrategy(OOOptimizer):
         X_first = self.ask(popsize, xmean=xmean, gradf=gradf, args=args)
         if xmean is None:
             xmean = self.mean  # might have changed in self.ask
+        if is_vectorized(func):
+            # one call per evaluation round for all solutions, mirrors are
+            # evaluated after the solutions they are taken from
+            def evaluate(X):
+                Xeval = X if kappa == 1 else [xmean + kappa * (x - xmean) for x in X]
+                F = list(zip(*[_evaluate_all(func, Xeval, args)
+                               for _i in xrange(int(evaluations))]))
+                return [aggregation(F[k]) if evaluations > 1 and is_feasible(X[k], F[k][0])
+                        else F[k][0] for k in rglen(X)]
+            def resample_infeasible(X, fit, start):
+                for k in xrange(start, len(X)):
+                    rejected = 0
+                    while not is_feasible(X[k], fit[k]):  # rejection sampling
+                        rejected += 1
+                        if rejected == 1 and k >= popsize - nmirrors:
+                            self.mirrors_rejected_idx.append(k)
+                        X[k] = self.ask(1, xmean, sigma_fac)[0]
+                        fit[k] = evaluate([X[k]])[0]
+            X = X_first[:int(popsize) - nmirrors]
+            fit = evaluate(X)
+            resample_infeasible(X, fit, 0)
+            if nmirrors:
+                if selective_mirroring:
+                    self.mirrors_idx = np.argsort(fit)[-1:-1 - nmirrors:-1]
+                X += [self.get_mirror(X[self.mirrors_idx[popsize - 1 - k]])
+                      for k in xrange(int(popsize) - nmirrors, int(popsize))]
+                fit += evaluate(X[int(popsize) - nmirrors:])
+                resample_infeasible(X, fit, int(popsize) - nmirrors)
+            self.evaluations_per_f_value = int(evaluations)
+            return X, fit
         X = []
         for k in xrange(int(popsize)):
             x, f = X_first.pop(0), None
@@ -3613,6 +3787,9 @@ class CMAEvolutionStrategy(OOOptimizer):
         """
         if self._flgtelldone:
             raise _Error('tell should only be called once per iteration')
+        if self._time_last_ask is not None:
+            self.timer_evals_since_eigen += time.time() - self._time_last_ask
+            self._time_last_ask = None
 
         lam = len(solutions)
         if lam != array(function_values).shape[0]:
@@ -3636,9 +3813,25 @@ class CMAEvolutionStrategy(OOOptimizer):
         if lam < sp.mu:  # rather decrease cmean instead of having mu > lambda//2
             raise _Error('not enough solutions passed to function tell (mu>lambda)')
 
+        # genotypes of unchanged solutions from a vectorized ask are at hand as matrix
+        pop_vectorized = None
+        if self._vectorized_pop is not None:
+            if len(solutions) == len(self._vectorized_pop[0]) and all(
+                    s is x for s, x in zip(solutions, self._vectorized_pop[0])):
+                pop_vectorized = self._vectorized_pop[1]
+                self._vectorized_pop = None
+            else:
+                self._flush_vectorized()
+
         self.countiter += 1  # >= 1 now
         self.countevals += sp.popsize * self.evaluations_per_f_value
-        self.best.update(solutions, self.sent_solutions, function_values, self.countevals)
+        if pop_vectorized is None:
+            self.best.update(solutions, self.sent_solutions, function_values, self.countevals)
+        else:
+            self.best.update(solutions, None, function_values, self.countevals)
+            imin = np.nanargmin(function_values)
+            if self.best.x is solutions[imin]:
+                self.best.x_geno = pop_vectorized[imin]
 
         flg_diagonal = self.opts['CMA_diagonal'] is True \
                        or self.countiter <= self.opts['CMA_diagonal']
@@ -3650,6 +3843,7 @@ class CMAEvolutionStrategy(OOOptimizer):
                 idx = np.argsort(self.D)
                 self.D = self.D[idx]
                 self.B = self.B[:, idx]
+                self._BD = None
             self._Yneg = np.zeros((N, N))
 
         # ## manage fitness
@@ -3683,7 +3877,9 @@ class CMAEvolutionStrategy(OOOptimizer):
         # TODO: clean up inconsistency when an unrepaired solution is available and used
         # now get the genotypes
         pop = self.pop_sorted = []  # create pop from input argument solutions
-        for k, s in enumerate(solutions):  # use phenotype before Solution.repair()
+        if pop_vectorized is not None:
+            pop = array(pop_vectorized, copy=True)  # might be repaired below
+        for k, s in enumerate(solutions if pop_vectorized is None else []):  # use phenotype before Solution.repair()
             if 1 < 3:
                 pop += [self.gp.geno(s,
                             from_bounds=self.boundary_handler.inverse,
@@ -3804,9 +4000,8 @@ class CMAEvolutionStrategy(OOOptimizer):
                 if self.sp.neg.cmuexp:
                     tmp = (pop[-sp.neg.mu:] - mold) / (self.sigma * self.sigma_vec)
                     # normalize to constant length (seems preferable in several aspects)
-                    for i in xrange(tmp.shape[0]):
-                        tmp[i, :] *= N**0.5 / self.mahalanobis_norm(
-                                 self.sigma_vec * tmp[i, :]) / self.sigma
+                    # sigma times the Mahalanobis norm of each row is |D^-1 B^T tmp[i]|
+                    tmp *= N**0.5 / sqrt(sum(dot(tmp, self.B / self.D)**2, 1))[:, None]
                     self._Yneg *= 1 - self.sp.neg.cmuexp  # for some reason necessary?
                     self._Yneg += dot(sp.neg.weights * tmp.T, tmp) - self.C
                     # self.update_exponential(dot(sp.neg.weights * tmp.T, tmp) - 1 * self.C, -1*self.sp.neg.cmuexp)
@@ -3817,10 +4012,8 @@ class CMAEvolutionStrategy(OOOptimizer):
 
             else:  # separable/diagonal linear case
                 assert(c1 + cmu <= 1)
-                Z = np.zeros(N)
-                for k in xrange(sp.mu):
-                    z = (pop[k] - mold) / (self.sigma * self.sigma_vec)  # TODO see above
-                    Z += sp.weights[k] * z * z  # is 1-D
+                Z = (pop[0:sp.mu] - mold) / (self.sigma * self.sigma_vec)
+                Z = dot(sp.weights, Z**2)  # is 1-D
                 self.C = (1 - c1a - cmu) * self.C + c1 * self.pc * self.pc + cmu * Z
                 # TODO: self.C *= exp(cmuneg * (N - dot(sp.neg.weights,  **2)
                 self.dC = self.C
@@ -3973,7 +4166,7 @@ class CMAEvolutionStrategy(OOOptimizer):
         CMA_diagonal / separable option on.
 
         """
-        if self.opts['CMA_diagonal']:
+        if len(self.C.shape) == 1:  # still in the diagonal phase
             _print_warning("this might fail with CMA_diagonal option on",
                        iteration=self.countiter)
             print(self.opts['CMA_diagonal'])
@@ -3998,6 +4191,7 @@ class CMAEvolutionStrategy(OOOptimizer):
         idx = np.argsort(self.D)
         self.D = self.D[idx]
         self.B = self.B[:, idx]  # self.B[i] is a row, columns self.B[:,i] are eigenvectors
+        self._BD = None
         self.count_eigen += 1
     def updateBD(self):
         """update internal variables for sampling the distribution with the
@@ -4008,6 +4202,7 @@ class CMAEvolutionStrategy(OOOptimizer):
         # just double check here
         if self.itereigenupdated == self.countiter:
             return
+        tic = time.time()
         if self.opts['CMA_diagonal'] >= self.countiter:
             _print_warning("updateBD called in CMA_diagonal mode, " +
                            "this should be considered a bug", "updateBD",
@@ -4112,6 +4307,7 @@ class CMAEvolutionStrategy(OOOptimizer):
             self.pc = self.gp.geno(self.pc)
             self.D[:] = 1.0
             self.B = np.eye(self.N)
+            self._BD = None
             self.C = np.eye(self.N)
             self.dC[:] = 1.0
             self.sigma_vec = 1
@@ -4121,6 +4317,9 @@ class CMAEvolutionStrategy(OOOptimizer):
                            'updateBD', 'CMAEvolutionStrategy', self.countiter)
 
         self.itereigenupdated = self.countiter
+        self.timer_eigen_last = time.time() - tic
+        self.timer_eigen += self.timer_eigen_last
+        self.timer_evals_since_eigen = 0.
 
     def multiplyC(self, alpha):
         """multiply C with a scalar and update all related internal variables (dC, D,...)"""
@@ -4128,6 +4327,7 @@ class CMAEvolutionStrategy(OOOptimizer):
         if self.dC is not self.C:
             self.dC *= alpha
         self.D *= alpha**0.5
+        self._BD = None
     def update_exponential(self, Z, eta, BDpair=None):
         """exponential update of C that guarantees positive definiteness, that is,
         instead of the assignment ``C = C + eta * Z``,
@@ -4285,7 +4485,8 @@ class CMAEvolutionStrategy(OOOptimizer):
 
     def disp_annotation(self):
         """print annotation for `disp()`"""
-        print('Iterat #Fevals   function value  axis ratio  sigma  min&max std  t[m:s]')
+        print('Iterat #Fevals   function value  axis ratio  sigma  min&max std  t[m:s]'
+              + ('  eig[s]' if self.opts['CMA_eigen_timefrac'] is not None else ''))
         sys.stdout.flush()
 
     def disp(self, modulo=None):  # TODO: rather assign opt['verb_disp'] as default?
@@ -4307,6 +4508,9 @@ class CMAEvolutionStrategy(OOOptimizer):
                     stime = str(int(toc // 60)) + ':' + str(round(toc % 60, 1))
                 else:
                     stime = ''
+                if self.opts['CMA_eigen_timefrac'] is not None:
+                    # time spent in updateBD, total and last call
+                    stime += ' %.1f/%.2f' % (self.timer_eigen, self.timer_eigen_last)
                 print(' '.join((repr(self.countiter).rjust(5),
                                 repr(self.countevals).rjust(6),
                                 '%.15e' % (min(self.fit.fit)),
@@ -4328,6 +4532,455 @@ class CMAEvolutionStrategy(OOOptimizer):
                            'plot', 'CMAEvolutionStrategy')
         return self
 
+class LMCMAEvolutionStrategy(OOOptimizer):
+    """limited-memory CMA-ES for large dimensions, a low-rank plus
+    diagonal variant of `CMAEvolutionStrategy`.
+
+    The covariance matrix is never stored. Instead the sample
+    distribution is ``x = mean + sigma * d * (A z)`` with ``z`` standard
+    normal, a diagonal scaling vector ``d`` and a Cholesky factor ``A``
+    that is represented implicitly by the last ``m`` stored evolution
+    paths (Loshchilov 2014, LM-CMA). Memory and the cost per sample are
+    ``O(m * N)``, where ``m`` is given by option ``CMA_lm_memory``,
+    hence dimensions of 10^4 and more are feasible on a single machine.
+
+    The interface is the same as for `CMAEvolutionStrategy`, namely
+    `ask`, `tell`, `stop`, `result`, `disp` and the inherited
+    `optimize`, and the options are read from `CMAOptions`. Only the
+    options ``popsize, CMA_mu, CMA_lm_memory, maxiter, maxfevals,
+    ftarget, tolfun, tolx, seed, verbose, verb_disp, verb_time`` are
+    interpreted, boundaries are not supported.
+
+    Example
+    -------
+    ::
+
+        import cma
+        es = cma.LMCMAEvolutionStrategy(1000 * [1], 0.5, {'ftarget': 1e-8})
+        es.optimize(cma.fcts.elli)
+        print(es.result()[1])
+
+    Details
+    -------
+    The step-size is adapted with the rank-based success rule of
+    LM-CMA: the current population is ranked together with the
+    previous one and ``sigma`` increases when the current population
+    ranks better than a target fraction. The diagonal ``d`` is
+    adapted with a small learning rate like in sep-CMA, taking the
+    samples back to the ``z``-space first.
+
+    """
+    def __init__(self, x0, sigma0, inopts={}):
+        """see class `LMCMAEvolutionStrategy`"""
+        self.inopts = inopts
+        opts = CMAOptions(inopts).complement()
+        if opts.eval('verbose') < -8:
+            opts['verb_disp'] = 0
+        if isinstance(x0, basestring):
+            x0 = eval(x0)
+        self.x0 = array(x0, dtype=float)
+        if self.x0.ndim != 1 or len(self.x0) <= 1:
+            raise _Error('x0 must be a 1-D array of length > 1')
+        N = self.N = len(self.x0)
+        opts.evalall({'N': N})
+        if opts['bounds'] not in (None, [None, None]):
+            raise _Error('boundaries are not supported by LMCMAEvolutionStrategy')
+        self.opts = opts
+
+        if not opts['seed']:
+            np.random.seed()
+            six_decimals = (time.time() - 1e6 * (time.time() // 1e6))
+            opts['seed'] = 1e5 * np.random.rand() + six_decimals + 1e5 * (time.time() % 1)
+        opts['seed'] = int(opts['seed'])
+        np.random.seed(opts['seed'])  # CAVEAT: this only seeds np.random
+
+        # strategy parameters
+        self.popsize = int(opts['popsize'])
+        self.mu = int(opts['CMA_mu']) if opts['CMA_mu'] else self.popsize // 2
+        weights = log(self.mu + 0.5) - log(np.arange(1, self.mu + 1))
+        self.weights = weights / sum(weights)
+        self.mueff = 1. / sum(self.weights**2)
+        self.memory = max(1, min(int(opts['CMA_lm_memory']), N))
+        self.cc = 0.5 / N**0.5
+        self.c1 = 0.1 / log(N + 1.)
+        self.cd = 1. / (N + 2.)  # learning rate of the diagonal
+        self.store_every = max(1, int(log(N)))  # iterations between stored paths
+        self.success_target = 0.3  # of the rank-based success rule
+        self.cs = 0.3
+        self.damps = 1.
+
+        # state variables
+        self.mean = self.x0.copy()
+        self.sigma0 = self.sigma = sigma0
+        self.d = np.ones(N)
+        self.pc = np.zeros(N)
+        self.P = np.zeros((0, N))  # stored evolution paths, oldest first
+        self.V = np.zeros((0, N))  # V[j] = A_j^-1 P[j], A_j being A before P[j] was added
+        self.bcoef = np.zeros(0)  # coefficients to compute A * z
+        self.dcoef = np.zeros(0)  # coefficients to compute A^-1 * z
+        self.success = 0.
+        self.countiter = 0
+        self.countevals = 0
+        self.best = BestSolution()
+        self.logger = None  # `optimize` uses the logger passed as argument
+        self.elapsed_time = ElapsedTime()
+        self._stopdict = _CMAStopDict()
+        self.callbackstop = 0
+
+        self.fit = _BlancClass()
+        self.fit.fit = []
+        self.fit.fit_previous = None
+        self.fit.hist = []
+
+        if opts['verb_disp'] > 0 and opts['verbose'] >= 0:
+            print('(%d_w,%d)-LM-CMA-ES (mu_w=%2.1f,w_1=%d%%) with %d stored vectors'
+                  % (self.mu, self.popsize, self.mueff, int(100 * self.weights[0]),
+                     self.memory) +
+                  ' in dimension %d (seed=%d, %s)' % (N, opts['seed'], time.asctime()))
+
+    def _A_times(self, Z):
+        """return ``A z`` for each row ``z`` of ``Z``, in ``O(m * N)`` per row"""
+        a = (1 - self.c1)**0.5
+        Y = Z
+        for p, v, b in zip(self.P, self.V, self.bcoef):
+            Y = a * Y + b * np.outer(np.dot(Z, v), p)
+        return Y
+
+    def _Ainv_times(self, y, end=None):
+        """return ``A^-1 y`` using the first `end` stored vectors"""
+        c = 1. / (1 - self.c1)**0.5
+        for v, d in zip(self.V[:end], self.dcoef[:end]):
+            y = c * y - d * np.dot(v, y) * v
+        return y
+
+    def _set_coefficients(self, j):
+        """set `bcoef` and `dcoef` of stored vector ``j`` from ``V[j]``"""
+        a = (1 - self.c1)**0.5
+        vv = np.dot(self.V[j], self.V[j])
+        if vv < 1e-30:  # a zero vector does not change A
+            self.bcoef[j] = self.dcoef[j] = 0
+            return
+        self.bcoef[j] = a / vv * ((1 + self.c1 / (1 - self.c1) * vv)**0.5 - 1)
+        # Sherman-Morrison for (a I + b v v^T)^-1 = (I - d v v^T) / a
+        self.dcoef[j] = self.bcoef[j] / (a * (a + self.bcoef[j] * vv))
+
+    def _store_path(self):
+        """append the current evolution path to the stored vectors and
+        recompute the dependent vectors when the oldest is dropped"""
+        if len(self.P) < self.memory:
+            self.P = np.vstack((self.P, self.pc))
+            self.V = np.vstack((self.V, self._Ainv_times(self.pc)))
+            self.bcoef = np.append(self.bcoef, 0.)
+            self.dcoef = np.append(self.dcoef, 0.)
+            self._set_coefficients(len(self.P) - 1)
+            return
+        # FIFO, A changes as a whole, hence all V[j] change
+        self.P = np.roll(self.P, -1, axis=0)
+        self.P[-1] = self.pc
+        for j in range(len(self.P)):
+            self.V[j] = self._Ainv_times(self.P[j], j)
+            self._set_coefficients(j)
+
+    def ask(self, number=None, xmean=None, sigma_fac=1):
+        """get new candidate solutions, sampled from
+        ``mean + sigma * d * (A z)``.
+
+        Arguments
+        ---------
+            `number`
+                number of returned solutions, by default the population size
+            `xmean`
+                distribution mean, by default the current mean
+            `sigma_fac`
+                multiplier for internal sample width (standard deviation)
+
+        Return
+        ------
+        A list of N-dimensional candidate solutions to be evaluated
+
+        """
+        if number is None or number < 1:
+            number = self.popsize
+        if xmean is None:
+            xmean = self.mean
+        Y = self._A_times(np.random.randn(number, self.N))
+        X = xmean + (sigma_fac * self.sigma) * self.d * Y
+        return list(X)
+
+    def tell(self, solutions, function_values):
+        """pass objective function values to prepare for next
+        iteration, see `CMAEvolutionStrategy.tell`.
+
+        `solutions` are expected to be sampled with ``xmean=None``.
+
+        """
+        if len(solutions) < self.mu or len(solutions) != len(function_values):
+            raise _Error('number of solutions must be at least mu=%d and equal '
+                         'to the number of function values' % self.mu)
+        self.countiter += 1
+        self.countevals += len(function_values)
+        fit = self.fit
+        function_values = array(function_values, dtype=float)
+        idx = np.argsort(function_values)
+        fit.fit = function_values[idx]
+        self.best.update([solutions[idx[0]]], None, [fit.fit[0]], self.countevals)
+        fit.hist.insert(0, fit.fit[0])
+        if len(fit.hist) > 10 + 30 * self.N / self.popsize:
+            fit.hist.pop()
+
+        # normalized steps, these are A z
+        Y = (array(solutions, dtype=float)[idx[:self.mu]] - self.mean) / (self.sigma * self.d)
+        ymean = np.dot(self.weights, Y)
+        self.mean = self.mean + self.sigma * self.d * ymean
+        self.pc = (1 - self.cc) * self.pc + (self.cc * (2 - self.cc) * self.mueff)**0.5 * ymean
+
+        # diagonal, from the selected steps in z-space
+        Z = array([self._Ainv_times(y) for y in Y])
+        self.d *= (1 - self.cd + self.cd * np.dot(self.weights, Z**2))**0.5
+
+        if self.countiter % self.store_every == 0:
+            self._store_path()
+
+        # rank-based success rule, comparing with the previous population
+        if fit.fit_previous is not None and len(fit.fit_previous) == len(fit.fit):
+            ranks = np.argsort(np.argsort(np.hstack((fit.fit_previous, fit.fit))))
+            lam = len(fit.fit)
+            z = (sum(ranks[:lam]) - sum(ranks[lam:])) / float(lam)**2 - self.success_target
+            self.success = (1 - self.cs) * self.success + self.cs * z
+            self.sigma *= exp(self.success / self.damps)
+        fit.fit_previous = fit.fit
+
+    def stop(self, check=True):
+        """return a dictionary with the termination status, see
+        `CMAEvolutionStrategy.stop`"""
+        if not check or self.countiter == 0:
+            return self._stopdict
+        opts = self.opts
+        stop = self._stopdict
+        stop.clear()
+        if self.countiter >= opts['maxiter']:
+            stop['maxiter'] = opts['maxiter']
+        if self.countevals >= opts['maxfevals']:
+            stop['maxfevals'] = opts['maxfevals']
+        if self.best.f <= opts['ftarget']:
+            stop['ftarget'] = opts['ftarget']
+        if (self.fit.fit[-1] - self.fit.fit[0] < opts['tolfun'] and
+                max(self.fit.hist) - min(self.fit.hist) < opts['tolfun']):
+            stop['tolfun'] = opts['tolfun']
+        if self.sigma * max(self.d) * max(1, max(abs(self.pc))) < opts['tolx']:
+            stop['tolx'] = opts['tolx']
+        if self.callbackstop:
+            stop['callback'] = self.callbackstop
+        return stop
+
+    def result(self):
+        """return ``(xbest, f(xbest), evaluations_xbest, evaluations,
+        iterations, xmean, stds)``, like `CMAEvolutionStrategy.result`.
+
+        `stds` only reflect the diagonal ``sigma * d``, computing the
+        diagonal of ``A A^T`` would take ``O(m * N)`` extra.
+
+        """
+        return self.best.get() + (self.countevals, self.countiter,
+                                  self.mean, self.sigma * self.d)
+
+    def disp_annotation(self):
+        """print annotation for `disp()`"""
+        print('Iterat #Fevals   function value  axis ratio  sigma  min&max std  t[m:s]')
+        sys.stdout.flush()
+
+    def disp(self, modulo=None):
+        """prints some single-line infos according to `disp_annotation()`,
+        if ``iteration_counter % modulo == 0``. The axis ratio is that
+        of the diagonal ``d`` only.
+
+        """
+        if modulo is None:
+            modulo = self.opts['verb_disp']
+        if modulo:
+            if (self.countiter - 1) % (10 * modulo) < 1:
+                self.disp_annotation()
+            if self.countiter > 0 and (self.stop() or self.countiter < 4
+                                       or self.countiter % modulo < 1):
+                if self.opts['verb_time']:
+                    toc = self.elapsed_time()
+                    stime = str(int(toc // 60)) + ':' + str(round(toc % 60, 1))
+                else:
+                    stime = ''
+                print(' '.join((repr(self.countiter).rjust(5),
+                                repr(self.countevals).rjust(6),
+                                '%.15e' % (min(self.fit.fit)),
+                                '%4.1e' % (self.d.max() / self.d.min()),
+                                '%6.2e' % self.sigma,
+                                '%6.0e' % (self.sigma * self.d.min()),
+                                '%6.0e' % (self.sigma * self.d.max()),
+                                stime)))
+                sys.stdout.flush()
+        return self
+
+# ____________________________________________________________
+# ____________________________________________________________
+class CMAAsyncDriver(object):
+    """asynchronous steady-state driver for `CMAEvolutionStrategy`.
+
+    ``num_workers`` objective function evaluations are kept in flight
+    on a pool of workers. Results are collected as they arrive and,
+    as soon as ``batch_size`` of them are available, passed to
+    `CMAEvolutionStrategy.tell`. New candidates are then sampled from
+    the updated distribution without waiting for the remaining
+    evaluations, such that no worker idles while stragglers finish.
+
+    Candidates which are still evaluated when the distribution has
+    moved on are *stale*. Their step from the current mean is repaired
+    like for injected solutions (see `CMAEvolutionStrategy.tell` with
+    argument `check_points` and `CMAEvolutionStrategy.repair_genotype`).
+    Candidates older than ``max_age`` iterations are only used to
+    update the best solution seen.
+
+    Example
+    -------
+    Evaluations with variable latency, between 0.1 and 1 milliseconds:
+
+    >>> import cma
+    >>> es = cma.CMAEvolutionStrategy(4 * [1], 1, {'ftarget': 1e-8,
+    ...                     'verb_disp': 0, 'verb_log': 0, 'seed': 3})
+    >>> driver = cma.CMAAsyncDriver(es, num_workers=4)
+    >>> _ = driver.optimize(cma.fcts.delayed, args=(cma.fcts.sphere, 1e-4))
+    >>> assert es.result()[1] < 1e-8
+    >>> assert driver.evaluations >= es.countevals - es.sp.popsize
+
+    By default, the evaluations run on a `multiprocessing.pool.ThreadPool`,
+    which takes any objective function, and overlaps evaluations which
+    wait or release the GIL, like calls of an external simulator. CPU
+    bound Python objectives run in parallel on a `multiprocessing.Pool`,
+    passed as `pool`, if the objective and its arguments are picklable
+    (e.g. module level functions, but not methods under Python 2)::
+
+        import multiprocessing
+        driver.optimize(objective, pool=multiprocessing.Pool(8))
+
+    :See: `CMAEvolutionStrategy.tell`, `FitnessFunctions.delayed`
+
+    """
+    def __init__(self, es, num_workers=None, batch_size=None, max_age=2):
+        """
+        Arguments
+        ---------
+            `es`
+                `CMAEvolutionStrategy` instance to be driven
+            `num_workers`
+                number of evaluations in flight, by default the
+                number of CPUs
+            `batch_size`
+                number of solutions passed to each call of `tell`,
+                by default ``max(es.popsize, num_workers)``, at least
+                ``es.popsize``. A batch smaller than the number of
+                workers lets most solutions become stale, smaller
+                batches call for a smaller ``popsize`` option.
+            `max_age`
+                maximal number of iterations a candidate may have been
+                sampled before it is passed to `tell`
+
+        """
+        if num_workers is None:
+            import multiprocessing
+            num_workers = multiprocessing.cpu_count()
+        self.es = es
+        self.num_workers = num_workers
+        self.batch_size = batch_size if batch_size else max((es.sp.popsize, num_workers))
+        if self.batch_size < es.sp.popsize:
+            raise _Error('batch_size=%d must not be smaller than popsize=%d'
+                         % (self.batch_size, es.sp.popsize))
+        self.max_age = max_age
+        self.evaluations = 0  # number of collected objective function values
+        self.count_stale = 0  # number of told solutions sampled before the last tell
+        self.count_discarded = 0  # number of solutions older than max_age
+
+    def optimize(self, objective_fct, args=(), pool=None, iterations=None,
+                 verb_disp=None, logger=None, poll_interval=1e-3):
+        """evaluate candidates of ``self.es`` with ``objective_fct(x,
+        *args)`` asynchronously on `pool` until ``self.es.stop()`` or
+        `iterations` calls of `tell`.
+
+        `pool` must provide ``apply_async`` like `multiprocessing.Pool`,
+        by default a `multiprocessing.pool.ThreadPool` with
+        ``self.num_workers`` threads is created and terminated at the end,
+        discarding the results of evaluations still running.
+        `verb_disp` and `logger` are used as in `OOOptimizer.optimize`.
+
+        Return the driven `CMAEvolutionStrategy` instance.
+
+        """
+        es = self.es
+        own_pool = pool is None
+        if own_pool:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(self.num_workers)
+        if verb_disp is None:
+            verb_disp = es.opts['verb_disp']
+        if logger is None:
+            logger = es.logger if hasattr(es, 'logger') else None
+        args = tuple(args)
+
+        running = []  # (asynchronous result, x, iteration when sampled)
+        ready = []  # sampled but not yet submitted
+        ready_iteration = es.countiter
+        done = []  # (x, f, iteration when sampled)
+        citer = 0
+        try:
+            while not es.stop() and (iterations is None or citer < iterations):
+                # keep all workers busy
+                while len(running) < self.num_workers:
+                    if not ready:
+                        ready, ready_iteration = list(es.ask()), es.countiter
+                    x = ready.pop(0)
+                    running.append((pool.apply_async(objective_fct, (x,) + args),
+                                    x, ready_iteration))
+
+                finished = [r for r in running if r[0].ready()]
+                if not finished:
+                    running[0][0].wait(poll_interval)
+                    continue
+                for r in finished:
+                    running.remove(r)
+                    f = r[0].get()  # re-raises exceptions of the objective
+                    self.evaluations += 1
+                    if es.countiter - r[2] > self.max_age:
+                        es.countevals += es.evaluations_per_f_value
+                        es.best.update([r[1]], es.sent_solutions, [f], es.countevals)
+                        self.count_discarded += 1
+                    else:
+                        done.append((r[1], f, r[2]))
+                if len(done) < self.batch_size:
+                    continue
+
+                batch, done = done[:self.batch_size], done[self.batch_size:]
+                stale = [i for i, b in enumerate(batch) if b[2] < es.countiter]
+                self.count_stale += len(stale)
+                es.tell([b[0] for b in batch], [b[1] for b in batch],
+                        check_points=stale if stale else None)
+                es.countevals += (len(batch) - es.sp.popsize) * es.evaluations_per_f_value
+                citer += 1
+                es.disp(verb_disp)
+                logger.add(es) if logger else None
+
+                # replace unsubmitted candidates by samples from the new distribution
+                for x in ready:
+                    es.sent_solutions.pop(x, None)
+                ready, ready_iteration = list(es.ask()), es.countiter
+        finally:
+            if own_pool:
+                pool.terminate()
+                pool.join()
+
+        try:
+            logger.add(es, modulo=bool(logger.modulo)) if logger else None
+        except (TypeError, AttributeError):
+            pass
+        if verb_disp:
+            es.disp(1)
+        return es
+
 cma_default_options = {
     # the follow string arguments are evaluated if they do not contain "filename"
     'AdaptSigma': 'CMAAdaptSigmaCSA  # or any other CMAAdaptSigmaBase class e.g. CMAAdaptSigmaTPA',
@@ -4335,9 +4988,12 @@ cma_default_options = {
 #    'CMA_activefac': '1  # learning rate multiplier for active update',
     'CMA_cmean': '1  # learning rate for the mean value',
     'CMA_const_trace': 'False  # normalize trace, value CMA_const_trace=2 normalizes sum log eigenvalues to zero',
-    'CMA_diagonal': '0*100*N/sqrt(popsize)  # nb of iterations with diagonal covariance matrix, True for always',  # TODO 4/ccov_separable?
+    'CMA_diagonal': '0*100*N/sqrt(popsize)  # nb of iterations with diagonal covariance matrix, True for always, time per sample and memory are linear in N until then',  # TODO 4/ccov_separable?
     'CMA_eigenmethod': 'np.linalg.eigh  # 0=numpy-s eigh, -1=pygsl, otherwise cma.Misc.eig (slower)',
+    'CMA_eigen_timefrac': 'None  #v postpone the eigendecomposition until its measured time is at most this fraction of the evaluation time since the last one, e.g. 0.1, None means the default fixed waiting time',
+    'CMA_eigen_maxwait': '10  #v with CMA_eigen_timefrac, decompose at the latest after this many times the default waiting time',
     'CMA_elitist': 'False  #v or "initial" or True, elitism likely impairs global search performance',
+    'CMA_lm_memory': '4 + int(3 * log(N))  # number of stored direction vectors in LMCMAEvolutionStrategy, time per sample and memory are linear in N times this number',
     'CMA_mirrors': 'popsize < 6  # values <0.5 are interpreted as fraction, values >1 as numbers (rounded), otherwise about 0.16 is used',
     'CMA_mirrormethod': '1  # 0=unconditional, 1=selective, 2==experimental',
     'CMA_mu': 'None  # parents selection parameter, default is popsize // 2',
@@ -4383,11 +5039,13 @@ cma_default_options = {
     'transformation': 'None  # [t0, t1] are two mappings, t0 transforms solutions from CMA-representation to f-representation (tf_pheno), t1 is the (optional) back transformation, see class GenoPheno',
     'typical_x': 'None  # used with scaling_of_variables',
     'updatecovwait': 'None  #v number of iterations without distribution update, name is subject to future changes',  # TODO: rename: iterwaitupdatedistribution?
+    'vectorized': 'False  #v transform and tell the population as one matrix without per-solution archives, faster for cheap functions in small dimension, not for injected solutions or BoundPenalty',
     'verbose': '1  #v verbosity e.v. of initial/final message, -1 is very quiet, -9 maximally quiet, not yet fully implemented',
     'verb_append': '0  # initial evaluation counter, if append, do not overwrite output files',
     'verb_disp': '100  #v verbosity: display console output every verb_disp iteration',
     'verb_filenameprefix': 'outcmaes  # output filenames prefix',
     'verb_log': '1  #v verbosity: write data to files every verb_log iteration, writing can be time critical on fast to evaluate functions',
+    'verb_log_binary': 'False  # write data with CMADataLoggerBinary, binary files written in a background thread',
     'verb_plot': '0  #v in fmin(): plot() is called every verb_plot iteration',
     'verb_time': 'True  #v output timings on console',
     'vv': '0  #? versatile variable for hacking purposes, value found in self.opts["vv"]'
@@ -4905,8 +5563,8 @@ class _CMAStopDict(dict):
                 i = es.countiter % N
                 self._addstop('noeffectaxis',
                              sum(es.mean == es.mean + 0.1 * es.sigma * es.D[i] * es.B[:, i]) == N)
-            self._addstop('conditioncov',
-                         es.D[-1] > 1e7 * es.D[0], 1e14)  # TODO
+            self._addstop('conditioncov',  # D is not sorted in the diagonal case
+                         es.D.max() > 1e7 * es.D.min(), 1e14)  # TODO
 
             self._addstop('callback', es.callbackstop)  # termination_callback
         try:
@@ -5177,6 +5835,8 @@ def fmin(objective_function, x0, sigma0,
             which is interpreted as outright rejection of solution `x`
             and invokes an immediate resampling and (re-)evaluation
             of a new solution not counting as function evaluation.
+            If marked with `vectorized_objective`, it is called with
+            all solutions of an iteration as 2-D array instead.
         `x0`
             list or `numpy.ndarray`, initial guess of minimum solution
             before the application of the geno-phenotype transformation
@@ -5470,7 +6130,7 @@ def fmin(objective_function, x0, sigma0,
                                     into_bounds=es.boundary_handler.repair,
                                     archive=es.sent_solutions)
                     es.best.update([x], es.sent_solutions,
-                                   [objective_function(x, *args)], 1)
+                                   _evaluate_all(objective_function, [x], args), 1)
                     es.countevals += 1
 
             opts = es.opts  # processed options, unambiguous
@@ -5486,8 +6146,9 @@ def fmin(objective_function, x0, sigma0,
             append = opts['verb_append'] or es.countiter > 0 or irun > 0
             # es.logger is "the same" logger, because the "identity"
             # is only determined by the `filenameprefix`
-            logger = CMADataLogger(opts['verb_filenameprefix'],
-                                   opts['verb_log'])
+            logger = (CMADataLoggerBinary if opts['verb_log_binary']
+                      else CMADataLogger)(opts['verb_filenameprefix'],
+                                          opts['verb_log'])
             logger.register(es, append).add()  # no fitness values here
             es.logger = logger
 
@@ -5534,7 +6195,7 @@ def fmin(objective_function, x0, sigma0,
 
             # end while not es.stop
             mean_pheno = es.gp.pheno(es.mean, into_bounds=es.boundary_handler.repair, archive=es.sent_solutions)
-            fmean = objective_function(mean_pheno, *args)
+            fmean = _evaluate_all(objective_function, [mean_pheno], args)[0]
             es.countevals += 1
 
             es.best.update([mean_pheno], es.sent_solutions, [fmean], es.countevals)
@@ -5678,6 +6339,7 @@ class CMADataLogger(BaseDataLogger):
 
     """
     default_prefix = 'outcmaes'
+    file_extension = '.dat'
     # names = ('axlen','fit','stddev','xmean','xrecentbest')
     # key_names_with_annotation = ('std', 'xmean', 'xrecent')
 
@@ -5844,17 +6506,18 @@ class CMADataLogger(BaseDataLogger):
             filenameprefix = self.name_prefix
         assert len(self.file_names) == len(self.key_names)
         for i in rglen((self.file_names)):
-            fn = filenameprefix + self.file_names[i] + '.dat'
+            fn = filenameprefix + self.file_names[i] + self.file_extension
             try:
-                self.__dict__[self.key_names[i]] = _fileToMatrix(fn)
+                self.__dict__[self.key_names[i]] = self._load_matrix(fn)
             except:
                 _print_warning('reading from file "' + fn + '" failed',
                                'load', 'CMADataLogger')
             try:
                 if self.key_names[i] in self._key_names_with_annotation:
                     # copy last row to later fill in annotation position for display
-                    self.__dict__[self.key_names[i]].append(
-                        self.__dict__[self.key_names[i]][-1])
+                    self.__dict__[self.key_names[i]] = \
+                        list(self.__dict__[self.key_names[i]]) + \
+                        [self.__dict__[self.key_names[i]][-1]]
                 self.__dict__[self.key_names[i]] = \
                     array(self.__dict__[self.key_names[i]], copy=False)
             except:
@@ -5862,6 +6525,10 @@ class CMADataLogger(BaseDataLogger):
                                'CMADataLogger')
         return self
 
+    def _load_matrix(self, file_name):
+        """return the data rows of a file written by `add`"""
+        return _fileToMatrix(file_name)
+
     def add(self, es=None, more_data=[], modulo=None):
         """append some logging data from `CMAEvolutionStrategy` class instance `es`,
         if ``number_of_times_called % modulo`` equals to zero, never if ``modulo==0``.
@@ -5923,109 +6590,69 @@ class CMADataLogger(BaseDataLogger):
         es.more_to_write = []
         # --- end interface ---
 
+        rows = []  # (file name, values) pairs to be written
+        # fit
+        if iteration > self.last_iteration:
+            rows.append(('fit', [iteration, evals, sigma, axratio, besteverf,
+                                 bestf, medianf, worstf]
+                                # + [es.sp.popsize, 10**es.noiseS, es.sp.cmean]
+                                + list(more_to_write) + list(more_data)))
+        # axlen
+        rows.append(('axlen', [iteration, evals, sigma, maxD, minD] + list(diagD)))
+        # correlation matrix eigenvalues
+        if 1 < 3:
+            c = es.correlation_matrix()
+            if c is not None:
+                # accept at most 50% internal loss
+                if self._eigen_counter < eigen_decompositions / 2:
+                    self.last_correlation_spectrum = \
+                        sorted(es.opts['CMA_eigenmethod'](c)[0]**0.5)
+                    self._eigen_counter += 1
+                if self.last_correlation_spectrum is None:
+                    self.last_correlation_spectrum = len(diagD) * [1]
+                c = c[c < 1 - 1e-14]  # remove diagonal elements
+                c[c > 1 - 1e-14] = 1 - 1e-14
+                c[c < -1 + 1e-14] = -1 + 1e-14
+                c_min = np.min(c)
+                c_max = np.max(c)
+                if np.min(abs(c)) == 0:
+                    c_medminus = 0  # thereby zero "is negative"
+                    c_medplus = 0  # thereby zero "is positive"
+                else:
+                    c_medminus = c[np.argmin(1/c)]  # c is flat
+                    c_medplus = c[np.argmax(1/c)]  # c is flat
+                rows.append(('axlencorr', [iteration, evals, c_min,
+                                           c_medminus,  # the one closest to 0
+                                           c_medplus,  # the one closest to 0
+                                           c_max]
+                                          + list(self.last_correlation_spectrum)))
+        # stddev
+        rows.append(('stddev', [iteration, evals, sigma, 0, 0] + list(diagC)))
+        # xmean, TODO should be optional the phenotyp?
+        rows.append(('xmean', [iteration, evals, 0, fmean_noise_free, fmean]
+                              + list(xmean)))
+        # xrecent
+        if iteration > 0 and xrecent is not None:
+            rows.append(('xrecentbest', [iteration, evals, sigma, 0, bestf]
+                                        + list(xrecent)))
         try:
-            # fit
-            if iteration > self.last_iteration:
-                fn = self.name_prefix + 'fit.dat'
-                with open(fn, 'a') as f:
-                    f.write(str(iteration) + ' '
-                            + str(evals) + ' '
-                            + str(sigma) + ' '
-                            + str(axratio) + ' '
-                            + str(besteverf) + ' '
-                            + '%.16e' % bestf + ' '
-                            + str(medianf) + ' '
-                            + str(worstf) + ' '
-                            # + str(es.sp.popsize) + ' '
-                            # + str(10**es.noiseS) + ' '
-                            # + str(es.sp.cmean) + ' '
-                            + ' '.join(str(i) for i in more_to_write) + ' '
-                            + ' '.join(str(i) for i in more_data) + ' '
-                            + '\n')
-            # axlen
-            fn = self.name_prefix + 'axlen.dat'
-            if 1 < 3:
-                with open(fn, 'a') as f:  # does not rely on reference counting
-                    f.write(str(iteration) + ' '
-                            + str(evals) + ' '
-                            + str(sigma) + ' '
-                            + str(maxD) + ' '
-                            + str(minD) + ' '
-                            + ' '.join(map(str, diagD))
-                            + '\n')
-            # correlation matrix eigenvalues
-            if 1 < 3:
-                fn = self.name_prefix + 'axlencorr.dat'
-                c = es.correlation_matrix()
-                if c is not None:
-                    # accept at most 50% internal loss
-                    if self._eigen_counter < eigen_decompositions / 2:
-                        self.last_correlation_spectrum = \
-                            sorted(es.opts['CMA_eigenmethod'](c)[0]**0.5)
-                        self._eigen_counter += 1
-                    if self.last_correlation_spectrum is None:
-                        self.last_correlation_spectrum = len(diagD) * [1]
-                    c = c[c < 1 - 1e-14]  # remove diagonal elements
-                    c[c > 1 - 1e-14] = 1 - 1e-14
-                    c[c < -1 + 1e-14] = -1 + 1e-14
-                    c_min = np.min(c)
-                    c_max = np.max(c)
-                    if np.min(abs(c)) == 0:
-                        c_medminus = 0  # thereby zero "is negative"
-                        c_medplus = 0  # thereby zero "is positive"
-                    else:
-                        c_medminus = c[np.argmin(1/c)]  # c is flat
-                        c_medplus = c[np.argmax(1/c)]  # c is flat
-
-                    with open(fn, 'a') as f:
-                        f.write(str(iteration) + ' '
-                                + str(evals) + ' '
-                                + str(c_min) + ' '
-                                + str(c_medminus) + ' ' # the one closest to 0
-                                + str(c_medplus) + ' ' # the one closest to 0
-                                + str(c_max) + ' '
-                                + ' '.join(map(str,
-                                        self.last_correlation_spectrum))
-                                + '\n')
-
-            # stddev
-            fn = self.name_prefix + 'stddev.dat'
-            with open(fn, 'a') as f:
-                f.write(str(iteration) + ' '
-                        + str(evals) + ' '
-                        + str(sigma) + ' '
-                        + '0 0 '
-                        + ' '.join(map(str, diagC))
-                        + '\n')
-            # xmean
-            fn = self.name_prefix + 'xmean.dat'
-            with open(fn, 'a') as f:
-                f.write(str(iteration) + ' '
-                        + str(evals) + ' '
-                        # + str(sigma) + ' '
-                        + '0 '
-                        + str(fmean_noise_free) + ' '
-                        + str(fmean) + ' '  # TODO: this does not make sense
-                        # TODO should be optional the phenotyp?
-                        + ' '.join(map(str, xmean))
-                        + '\n')
-            # xrecent
-            fn = self.name_prefix + 'xrecentbest.dat'
-            if iteration > 0 and xrecent is not None:
-                with open(fn, 'a') as f:
-                    f.write(str(iteration) + ' '
-                            + str(evals) + ' '
-                            + str(sigma) + ' '
-                            + '0 '
-                            + str(bestf) + ' '
-                            + ' '.join(map(str, xrecent))
-                            + '\n')
+            self._write_rows(rows)
         except (IOError, OSError):
             if iteration <= 1:
-                _print_warning(('could not open/write file %s: ' % fn,
+                _print_warning(('could not open/write file %s: ' % self.name_prefix,
                                 sys.exc_info()))
         self.last_iteration = iteration
 
+    def _write_rows(self, rows):
+        """append each ``(file_name, values)`` pair of `rows` as a line
+        of text to the respective file"""
+        for name, values in rows:
+            with open(self.name_prefix + name + self.file_extension, 'a') as f:
+                # the best f-value is written with full precision
+                f.write(' '.join('%.16e' % v if name == 'fit' and i == 5
+                                 else str(v) for i, v in enumerate(values))
+                        + '\n')
+
     def closefig(self):
         pyplot.close(self.fighandle)
 
@@ -6045,7 +6672,8 @@ class CMADataLogger(BaseDataLogger):
             return
 
         for name in self.file_names:
-            open(nameprefix + name + '.dat', 'w').write(open(self.name_prefix + name + '.dat').read())
+            open(nameprefix + name + self.file_extension, 'wb').write(
+                open(self.name_prefix + name + self.file_extension, 'rb').read())
 
         if switch:
             self.name_prefix = nameprefix
@@ -6700,7 +7328,7 @@ class CMADataLogger(BaseDataLogger):
                   ' %5.1e' % (dat.f[i, 3]) +
                   ' %6.2e' % (max(dat.std[j, 5:])) + ' %6.2e' % min(dat.std[j, 5:]))
 
-        dat = CMADataLogger(filenameprefix).load()
+        dat = self.__class__(filenameprefix).load()
         ndata = dat.f.shape[0]
 
         # map index to iteration number, is difficult if not all iteration numbers exist
@@ -6737,6 +7365,171 @@ class CMADataLogger(BaseDataLogger):
 
 # end class CMADataLogger
 
+class CMADataLoggerBinary(CMADataLogger):
+    """data logger for class `CMAEvolutionStrategy` with the same
+    interface as `CMADataLogger`, in particular `plot` and `disp`,
+    but writing binary files in a background thread and loading them
+    via memory mapping.
+
+    Each of the files ``name_prefix + name + '.bin'`` contains float64
+    values, first the number of columns, then the data rows. Rows are
+    passed to the writing thread through a queue of at most
+    `queue_size` iterations, such that `add` only blocks when the disk
+    cannot keep up. If writing fails with anything but an `IOError`,
+    the thread drops all further rows and the error is raised by the
+    next `add` or `flush`. `load` waits for the pending writes of all
+    binary loggers in this process with the same file name prefix.
+
+    The module functions `plot` and `disp` read binary files too.
+
+    Example
+    =======
+    ::
+
+        import cma
+        es = cma.CMAEvolutionStrategy(100 * [1], 1, {'verb_log_binary': True})
+        es.optimize(cma.fcts.elli)
+        es.logger.plot()  # waits for pending writes
+
+        cma.CMADataLoggerBinary('outcmaes').load().disp()
+
+    """
+    file_extension = '.bin'
+    _writers = weakref.WeakSet()  # loggers with a writing thread, see `load`
+
+    def __init__(self, name_prefix=CMADataLogger.default_prefix, modulo=1,
+                 append=False, queue_size=1000):
+        """see `CMADataLogger`, `queue_size` is the maximal number of
+        iterations waiting to be written"""
+        super(CMADataLoggerBinary, self).__init__(name_prefix, modulo, append)
+        self.queue_size = queue_size
+        self._queue = None
+        self._thread = None
+        self._files = {}  # open file handles
+        self._widths = {}  # number of columns
+        self._error = None  # exception that stopped the writing thread
+
+    def initialize(self, modulo=None):
+        """reset logger, overwrite original files, `modulo`: log only every modulo call"""
+        if modulo is not None:
+            self.modulo = modulo
+        if not hasattr(self, 'es'):
+            raise _Error('call register() before initialize()')
+        self.close()
+        self.counter = 0  # number of calls of add
+        self.last_iteration = 0  # some lines are only written if iteration>last_iteration
+        for name in self.file_names:
+            fn = self.name_prefix + name + self.file_extension
+            try:
+                open(fn, 'wb').close()
+            except (IOError, OSError):
+                print('could not open file ' + fn)
+        return self
+
+    def _write_rows(self, rows):
+        """pass `rows` to the writing thread, the values are copied"""
+        self._raise_error()
+        if self._thread is None:
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._write_loop)
+            self._thread.daemon = True
+            self._thread.start()
+            CMADataLoggerBinary._writers.add(self)
+            atexit.register(self._write_pending)
+        self._queue.put([(name, array(values, dtype=float))
+                         for name, values in rows])
+
+    def _write_loop(self):
+        """write rows from the queue, running in the background thread.
+
+        After an unexpected error, the rows are only taken from the queue,
+        such that `add` and `flush` never block, and raise the error.
+        """
+        while True:
+            rows = self._queue.get()
+            try:
+                if self._error is None:
+                    for name, values in rows:
+                        self._append_row(name, values)
+            except (IOError, OSError):
+                _print_warning(('could not write file: ', sys.exc_info()),
+                               '_write_loop', 'CMADataLoggerBinary')
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        """raise the error that stopped the writing thread, if any"""
+        if self._error is not None:
+            raise _Error('writing %s files failed: %r'
+                         % (self.name_prefix, self._error))
+
+    def _append_row(self, name, values):
+        fn = self.name_prefix + name + self.file_extension
+        if name not in self._files:
+            if os.path.exists(fn) and os.path.getsize(fn) > 0:  # append
+                self._widths[name] = int(np.fromfile(fn, count=1)[0])
+            self._files[name] = open(fn, 'ab')
+        f = self._files[name]
+        if name not in self._widths:
+            self._widths[name] = len(values)
+            f.write(array([len(values)], dtype=float).tobytes())
+        width = self._widths[name]
+        if len(values) != width:  # e.g. more_data has changed, pad or cut
+            values = np.hstack((values, width * [np.nan]))[:width]
+        f.write(values.tobytes())
+
+    def flush(self):
+        """wait until all rows passed to `add` are written to disk"""
+        self._write_pending()
+        self._raise_error()
+        return self
+
+    def _write_pending(self):
+        """like `flush`, but without raising the error of the writing
+        thread, which `add` raises already"""
+        if self._queue is not None:
+            self._queue.join()
+        for f in list(self._files.values()):
+            f.flush()
+
+    def close(self):
+        """write pending rows and close all files"""
+        self.flush()
+        for f in list(self._files.values()):
+            f.close()
+        self._files = {}
+        self._widths = {}
+        return self
+
+    def load(self, filenameprefix=None):
+        """load (or reload) data as memory mapped arrays, after the pending
+        writes of all binary loggers with this file name prefix are done,
+        see `CMADataLogger.load`"""
+        prefix = filenameprefix if filenameprefix else self.name_prefix
+        for logger in list(CMADataLoggerBinary._writers) + [self]:
+            if logger.name_prefix == prefix:
+                logger.flush()
+        return super(CMADataLoggerBinary, self).load(filenameprefix)
+
+    def _load_matrix(self, file_name):
+        return _binaryFileToMatrix(file_name)
+
+# end class CMADataLoggerBinary
+
+def _data_logger(name=None):
+    """return a `CMADataLogger` or `CMADataLoggerBinary` to read the
+    files with prefix `name`, depending on which format was written last
+    """
+    name = name if name else CMADataLogger.default_prefix
+    def modified(logger_class):
+        fn = name + 'fit' + logger_class.file_extension
+        return os.path.getmtime(fn) if os.path.exists(fn) else -1
+    if modified(CMADataLoggerBinary) > modified(CMADataLogger):
+        return CMADataLoggerBinary(name)
+    return CMADataLogger(name)
+
 # ____________________________________________________________
 # ____________________________________________________________
 #
@@ -6748,7 +7541,8 @@ def plot(name=None, fig=None, abscissa=1, iteridx=None,
     """
     plot data from files written by a `CMADataLogger`,
     the call ``cma.plot(name, **argsdict)`` is a shortcut for
-    ``cma.CMADataLogger(name).plot(**argsdict)``
+    ``cma.CMADataLogger(name).plot(**argsdict)``, or for
+    `CMADataLoggerBinary` if its files were written last
 
     Arguments
     ---------
@@ -6791,13 +7585,14 @@ def plot(name=None, fig=None, abscissa=1, iteridx=None,
         fig = last_figure_number
     if isinstance(fig, (int, float)):
         last_figure_number = fig
-    CMADataLogger(name).plot(fig, abscissa, iteridx, plot_mean, foffset,
-                             x_opt, fontsize)
+    _data_logger(name).plot(fig, abscissa, iteridx, plot_mean, foffset,
+                            x_opt, fontsize)
 
 def disp(name=None, idx=None):
     """displays selected data from (files written by) the class `CMADataLogger`.
 
-    The call ``cma.disp(name, idx)`` is a shortcut for ``cma.CMADataLogger(name).disp(idx)``.
+    The call ``cma.disp(name, idx)`` is a shortcut for ``cma.CMADataLogger(name).disp(idx)``,
+    or for `CMADataLoggerBinary` if its files were written last.
 
     Arguments
     ---------
@@ -6823,8 +7618,7 @@ def disp(name=None, idx=None):
     :See: `CMADataLogger.disp()`
 
     """
-    return CMADataLogger(name if name else CMADataLogger.default_prefix
-                         ).disp(idx)
+    return _data_logger(name).disp(idx)
 
 # ____________________________________________________________
 def _fileToMatrix(file_name):
@@ -6843,6 +7637,13 @@ def _fileToMatrix(file_name):
     #     except:
     print('could not read file ' + file_name)
 
+def _binaryFileToMatrix(file_name):
+    """return the data of a file written by `CMADataLoggerBinary` as
+    2-D array, memory mapped copy-on-write"""
+    width = int(np.fromfile(file_name, count=1)[0])
+    data = np.memmap(file_name, dtype=float, mode='c', offset=8)
+    return data[:len(data) // width * width].reshape(-1, width)
+
 # ____________________________________________________________
 # ____________________________________________________________
 class NoiseHandler(object):
@@ -7053,16 +7854,25 @@ class NoiseHandler(object):
             return self.idx
         evals = int(self.evaluations) if self.f_aggregate else 1
         fagg = np.median if self.f_aggregate is None else self.f_aggregate
-        for i in self.idx:
-            X_i = X[i]
+        if is_vectorized(func):  # all reevaluations in a single call
             if self.epsilon:
-                if self.parallel:
-                    self.fitre[i] = fagg(func(ask(evals, X_i, self.epsilon), *args))
-                else:
-                    self.fitre[i] = fagg([func(ask(1, X_i, self.epsilon)[0], *args)
-                                            for _k in xrange(evals)])
+                Xre = [x for i in self.idx for x in ask(evals, X[i], self.epsilon)]
             else:
-                self.fitre[i] = fagg([func(X_i, *args) for _k in xrange(evals)])
+                Xre = [X[i] for i in self.idx for _k in xrange(evals)]
+            fre = _evaluate_all(func, Xre, args)
+            for j, i in enumerate(self.idx):
+                self.fitre[i] = fagg(fre[j * evals:(j + 1) * evals])
+        else:
+            for i in self.idx:
+                X_i = X[i]
+                if self.epsilon:
+                    if self.parallel:
+                        self.fitre[i] = fagg(func(ask(evals, X_i, self.epsilon), *args))
+                    else:
+                        self.fitre[i] = fagg([func(ask(1, X_i, self.epsilon)[0], *args)
+                                                for _k in xrange(evals)])
+                else:
+                    self.fitre[i] = fagg([func(X_i, *args) for _k in xrange(evals)])
         self.evaluations_just_done = evals * len(self.idx)
         return self.fit, self.fitre, self.idx
 
@@ -7137,8 +7947,10 @@ class Sections(object):
     --------
 
     >>> import cma, numpy as np
-    >>> s = cma.Sections(cma.Fcts.rosen, np.zeros(3)).do(plot=False)
-    >>> s.do(plot=False)  # evaluate the same points again, i.e. check for noise
+    >>> s = cma.Sections(cma.Fcts.rosen, np.zeros(3), load=False).do(plot=False)
+    >>> _ = s.do(plot=False)  # evaluate the same points again, i.e. check for noise
+    >>> _ = s.do(repetitions=0, plot=False, refine=3)  # bisect near jumps
+
     >> try:
     ...     s.plot()
     ... except:
@@ -7146,8 +7958,19 @@ class Sections(object):
 
     Details
     -------
-    Data are saved after each function call during `do()`. The filename
-    is attribute ``name`` and by default ``str(func)``, see `__init__()`.
+    Data are saved after each round of evaluations during `do()`. The
+    filename is attribute ``name`` and by default the module and
+    (qualified) name of `func`, like ``'cma.FitnessFunctions.rosen'``,
+    see `__init__()`.
+
+    All evaluated values are also kept in ``s.cache``, a dictionary with
+    keys ``(func, args, x, direction, dx)``, where `func` and `args` are
+    identified by name and ``repr``. The cache is saved in a separate
+    file and shared by all instances with the same cache file name.
+    Points found in the cache are not evaluated again, even for a
+    different basis or middle point containing the same direction and
+    point. With argument
+    `pool`, `do()` evaluates all points of a round in parallel.
 
     A random (orthogonal) basis can be generated with
     ``cma.Rotation()(np.eye(3))``.
@@ -7159,7 +7982,9 @@ class Sections(object):
     previous data must first be renamed or deleted.
 
     ``s.res`` is a dictionary with an entry for each "coordinate" ``i``
-    and with an entry ``'x'``, the middle point. Each entry ``i`` is
+    and with an entry ``'x'``, the middle point, and ``'func'``, the
+    identity of `func` and `args` (data saved for other values are not
+    loaded). Each entry ``i`` is
     again a dictionary with keys being different dx values and the
     value being a sequence of f-values. For example ``s.res[2][0.1] ==
     [0.01, 0.01]``, which is generated using the difference vector ``s
@@ -7171,7 +7996,8 @@ class Sections(object):
 
     """
     def __init__(self, func, x, args=(), basis=None, name=None,
-                 plot_cmd=pyplot.plot if pyplot else None, load=True):
+                 plot_cmd=None, load=True,
+                 cache=True):
         """
         Parameters
         ----------
@@ -7188,30 +8014,42 @@ class Sections(object):
             `name`
                 filename where to save the result
             `plot_cmd`
-                command used to plot the data, typically matplotlib pyplots `plot` or `semilogy`
+                command used to plot the data, typically matplotlib pyplots `plot` or `semilogy`,
+                by default `plot`
             `load`
-                load previous data from file ``str(func) + '.pkl'``
+                load previous data from file ``name + '.pkl'``
+            `cache`
+                filename of the persistent cache of function values,
+                by default ``name + '-cache.pkl'``, ``False`` keeps the
+                cache in memory only
 
         """
         self.func = func
         self.args = args
         self.x = x
-        self.name = name if name else str(func).replace(' ', '_').replace('>', '').replace('<', '')
+        self.name = name if name else self._func_id()
         self.plot_cmd = plot_cmd  # or semilogy
         self.basis = np.eye(len(x)) if basis is None else basis
+        self.cache_name = None if cache is False else (
+            self.name + '-cache.pkl' if cache is True else cache)
+        self.cache = {}
+        if self.cache_name and os.path.exists(self.cache_name):
+            self.load_cache()
+
+        self.res = {'x': x, 'func': self._func_key()}
+        if load:
+            fresh = self.res
+            try:
+                self.load()
+                if any(self.res['x'] != x) or self.res.get('func') != fresh['func']:
+                    self.res = fresh  # TODO: res['x'] does not look perfect
+                else:
+                    print(self.name + ' loaded')
+            except:
+                self.res = fresh
 
-        try:
-            self.load()
-            if any(self.res['x'] != x):
-                self.res = {}
-                self.res['x'] = x  # TODO: res['x'] does not look perfect
-            else:
-                print(self.name + ' loaded')
-        except:
-            self.res = {}
-            self.res['x'] = x
-
-    def do(self, repetitions=1, locations=np.arange(-0.5, 0.6, 0.2), plot=True):
+    def do(self, repetitions=1, locations=np.arange(-0.5, 0.6, 0.2), plot=True,
+           pool=None, refine=0, refine_factor=3):
         """generates, plots and saves function values ``func(y)``,
         where ``y`` is 'close' to `x` (see `__init__()`). The data are stored in
         the ``res`` attribute and the class instance is saved in a file
@@ -7221,39 +8059,119 @@ class Sections(object):
         ----------
             `repetitions`
                 for each point, only for noisy functions is >1 useful. For
-                ``repetitions==0`` only already generated data are plotted.
+                ``repetitions==0`` only already generated data are plotted
+                or refined.
             `locations`
                 coordinated wise deviations from the middle point given in `__init__`
+            `pool`
+                `multiprocessing.Pool` (or any object with an
+                ``apply_async`` method) or number of processes to
+                evaluate the points of each round in parallel. A process
+                pool requires `func` and `args` to be picklable.
+            `refine`
+                number of rounds of bisection: each round evaluates the
+                middle of all intervals where the change of the (median)
+                function value exceeds `refine_factor` times the change
+                in the neighboring intervals, i.e. near discontinuities
+                and plateau edges.
 
         """
-        if not repetitions:
+        if not repetitions and not refine:
             self.plot()
-            return
+            return self
+
+        own_pool = pool is not None and not hasattr(pool, 'apply_async')
+        if own_pool:
+            import multiprocessing
+            pool = multiprocessing.Pool(pool)
+        try:
+            if repetitions:
+                self._add_values([(i, dx) for i in xrange(len(self.basis))
+                                  for dx in locations], repetitions, pool)
+            for _ in xrange(refine):
+                points = self._discontinuities(refine_factor)
+                if not points:
+                    break
+                self._add_values(points, max((1, repetitions)), pool)
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
+        if plot:
+            self.plot()
+        return self
 
+    def _add_values(self, points, repetitions, pool=None):
+        """append `repetitions` values to ``res[i][dx]`` for all
+        ``(i, dx)`` in `points`, taken from the cache if available and
+        evaluated (in parallel with `pool`) otherwise"""
         res = self.res
-        for i in xrange(len(self.basis)):  # i-th coordinate
-            if i not in res:
-                res[i] = {}
-            # xx = np.array(self.x)
-            # TODO: store res[i]['dx'] = self.basis[i] here?
-            for dx in locations:
-                xx = self.x + dx * self.basis[i]
-                xkey = dx  # xx[i] if (self.basis == np.eye(len(self.basis))).all() else dx
-                if xkey not in res[i]:
-                    res[i][xkey] = []
-                n = repetitions
-                while n > 0:
-                    n -= 1
-                    res[i][xkey].append(self.func(xx, *self.args))
-                    if plot:
-                        self.plot()
-                    self.save()
+        missing = []
+        for i, dx in points:
+            values = res.setdefault(i, {}).setdefault(dx, [])
+            cached = self.cache.setdefault(self._cache_key(i, dx), [])
+            if len(cached) < len(values):  # data from before the cache
+                cached[:] = values
+            missing += (len(values) + repetitions - len(cached)) * [(i, dx)]
+
+        xs = [self.x + dx * self.basis[i] for i, dx in missing]
+        if pool is None:
+            fs = [self.func(xx, *self.args) for xx in xs]
+        else:
+            fs = [r.get() for r in [pool.apply_async(self.func, (xx,) + tuple(self.args))
+                                    for xx in xs]]
+        for (i, dx), f in zip(missing, fs):
+            self.cache[self._cache_key(i, dx)].append(f)
+
+        for i, dx in points:
+            n = len(res[i][dx]) + repetitions
+            res[i][dx] = self.cache[self._cache_key(i, dx)][:n]
+        self.save()
+        if self.cache_name:
+            self.save_cache()
         return self
 
+    def _func_id(self):
+        """return a name of `func` which is stable between sessions,
+        unlike ``str(func)`` which contains the object address"""
+        func = self.func
+        name = getattr(func, '__qualname__', None)
+        if name is None:
+            name = getattr(func, '__name__', type(func).__name__)
+            owner = getattr(func, 'im_class', None)  # method in Python 2
+            if owner is not None:
+                name = owner.__name__ + '.' + name
+        module = getattr(func, '__module__', None) or type(func).__module__
+        return module + '.' + name
+
+    def _func_key(self):
+        return (self._func_id(), repr(tuple(self.args)))
+
+    def _cache_key(self, i, dx):
+        return self._func_key() + (tuple(float(xi) for xi in self.x),
+                                   tuple(float(bi) for bi in self.basis[i]),
+                                   float(dx))
+
+    def _discontinuities(self, refine_factor):
+        """return ``(i, dx)`` points bisecting the intervals with an
+        outstanding change of the median function value"""
+        points = []
+        for i in sorted(self.res):
+            if not isinstance(i, int) or len(self.res[i]) < 3:
+                continue
+            dxs = sorted(self.res[i])
+            jumps = np.abs(np.diff([np.median(self.res[i][dx]) for dx in dxs]))
+            floor = 1e-6 * max(jumps)  # ignore round-off on plateaus
+            for k in xrange(len(jumps)):
+                neighbors = [jumps[j] for j in (k - 1, k + 1) if 0 <= j < len(jumps)]
+                if jumps[k] > floor and jumps[k] > refine_factor * max(neighbors):
+                    points.append((i, (dxs[k] + dxs[k + 1]) / 2.))
+        return points
+
     def plot(self, plot_cmd=None, tf=lambda y: y):
         """plot the data we have, return ``self``"""
         if not plot_cmd:
-            plot_cmd = self.plot_cmd
+            plot_cmd = self.plot_cmd if self.plot_cmd else pyplot.plot
         colors = 'bgrcmyk'
         pyplot.hold(False)
         res = self.res
@@ -7300,9 +8218,12 @@ class Sections(object):
         import pickle
         name = name if name else self.name
         fun = self.func
+        cache = self.cache
         del self.func  # instance method produces error
+        del self.cache  # saved separately, see `save_cache`
         pickle.dump(self, open(name + '.pkl', "wb"))
         self.func = fun
+        self.cache = cache
         return self
 
     def load(self, name=None):
@@ -7313,6 +8234,27 @@ class Sections(object):
         self.res = s.res  # disregard the class
         return self
 
+    def save_cache(self, name=None):
+        """save the cache of function values, merged with the values
+        saved meanwhile by other instances"""
+        import pickle
+        name = name if name else self.cache_name
+        if os.path.exists(name):
+            for key, values in pickle.load(open(name, 'rb')).items():
+                if len(values) > len(self.cache.get(key, [])):
+                    self.cache[key] = values
+        with open(name + '.tmp', 'wb') as f:
+            pickle.dump(self.cache, f, -1)
+        os.rename(name + '.tmp', name)  # never leave a truncated cache
+        return self
+
+    def load_cache(self, name=None):
+        """load the cache of function values from file"""
+        import pickle
+        name = name if name else self.cache_name
+        self.cache = pickle.load(open(name, 'rb'))
+        return self
+
 #____________________________________________________________
 #____________________________________________________________
 class _Error(Exception):
@@ -8001,10 +8943,17 @@ class FFWrapper(object):
             # the original fitness to be called
             self.inner_fitness = fitness_function
             # self.condition_number = ...
+        @property
+        def vectorized(self):
+            """``True`` if the inner fitness accepts a population at once"""
+            return is_vectorized(self.inner_fitness)
         def __call__(self, x, *args):
             """identity as default transformation"""
             if hasattr(self, 'x_transformation'):
-                x = self.x_transformation(x)
+                if self.vectorized and not isscalar(x[0]):
+                    x = [self.x_transformation(xi) for xi in x]
+                else:
+                    x = self.x_transformation(x)
             f = self.inner_fitness(x, *args)
             if hasattr(self, 'f_transformation'):
                 f = self.f_transformation(f)
@@ -8024,7 +8973,10 @@ class FFWrapper(object):
             self.inner_fitness = callable
         def __call__(self, *args):
             # assert len(args[0])  # x-vector
-            self.count_evaluations += 1
+            if self.vectorized and not isscalar(args[0][0]):
+                self.count_evaluations += len(args[0])
+            else:
+                self.count_evaluations += 1
             return self.inner_fitness(*args)
     class TransformSearchSpace(FitnessTransformation):
         """::
@@ -8235,6 +9187,12 @@ class FitnessFunctions(object):
             return fun(rotate(x, *args))
         else:
             return fun(x)
+    def delayed(self, x, fun=None, delay=1e-3, spread=10, args=()):
+        """returns ``fun(x, *args)``, by default `sphere`, after a delay
+        between `delay` and ``spread * delay`` seconds, log-uniformly
+        distributed, to mimic heterogeneous evaluation times"""
+        time.sleep(delay * spread**np.random.rand())
+        return (fun if fun else self.sphere)(x, *args)
     def somenan(self, x, fun, p=0.1):
         """returns sometimes np.NaN, otherwise fun(x)"""
         if np.random.rand(1) < p:
@@ -8252,10 +9210,11 @@ class FitnessFunctions(object):
         if 1 < 3 and sum([ (10 + i) * x[i] for i in rglen(x)]) > 50e3:
             return np.nan
         return -sum(x)
+    @vectorized_objective
     def sphere(self, x):
         """Sphere (squared norm) test objective function"""
         # return np.random.rand(1)[0]**0 * sum(x**2) + 1 * np.random.rand(1)[0]
-        return sum((x + 0)**2)
+        return sum(array(x, copy=False)**2, -1)
     def grad_sphere(self, x, *args):
         return 2*array(x, copy=False)
     def grad_to_one(self, x, *args):
@@ -8334,13 +9293,14 @@ class FitnessFunctions(object):
         # return max(1e-19, f * np.exp(sig * N / f**expon))
         # return max(1e-19, f * normalSkew(f**expon)**sig)
         return f + 10**R  # == f + f**(1+0.5*RN)
+    @vectorized_objective
     def cigar(self, x, rot=0, cond=1e6, noise=0):
         """Cigar test objective function"""
+        x = array(x, copy=False, dtype=float)
         if rot:
-            x = rotate(x)
-        x = [x] if isscalar(x[0]) else x  # scalar into list
-        f = [(x[0]**2 + cond * sum(x[1:]**2)) * np.exp(noise * np.random.randn(1)[0] / len(x)) for x in x]
-        return f if len(f) > 1 else f[0]  # 1-element-list into scalar
+            x = rotate(x) if x.ndim == 1 else array([rotate(xi) for xi in x])
+        return (x[..., 0]**2 + cond * sum(x[..., 1:]**2, -1)) * \
+               np.exp(noise * np.random.randn(*x.shape[:-1]) / x.shape[-1])
     def grad_cigar(self, x, *args):
         grad = 2 * 1e6 * np.array(x)
         grad[0] /= 1e6
@@ -8351,28 +9311,28 @@ class FitnessFunctions(object):
         s = sum(proj**2)
         s += cond * sum((x - proj)**2)
         return s
+    @vectorized_objective
     def tablet(self, x, rot=0):
         """Tablet test objective function"""
+        x = array(x, copy=False, dtype=float)
         if rot and rot is not fcts.tablet:
-            x = rotate(x)
-        x = [x] if isscalar(x[0]) else x  # scalar into list
-        f = [1e6 * x[0]**2 + sum(x[1:]**2) for x in x]
-        return f if len(f) > 1 else f[0]  # 1-element-list into scalar
+            x = rotate(x) if x.ndim == 1 else array([rotate(xi) for xi in x])
+        return 1e6 * x[..., 0]**2 + sum(x[..., 1:]**2, -1)
     def grad_tablet(self, x, *args):
         grad = 2 * np.array(x)
         grad[0] *= 1e6
         return grad
+    @vectorized_objective
     def cigtab(self, y):
         """Cigtab test objective function"""
-        X = [y] if isscalar(y[0]) else y
-        f = [1e-4 * x[0]**2 + 1e4 * x[1]**2 + sum(x[2:]**2) for x in X]
-        return f if len(f) > 1 else f[0]
+        x = array(y, copy=False, dtype=float)
+        return 1e-4 * x[..., 0]**2 + 1e4 * x[..., 1]**2 + sum(x[..., 2:]**2, -1)
+    @vectorized_objective
     def twoaxes(self, y):
         """Cigtab test objective function"""
-        X = [y] if isscalar(y[0]) else y
-        N2 = len(X[0]) // 2
-        f = [1e6 * sum(x[0:N2]**2) + sum(x[N2:]**2) for x in X]
-        return f if len(f) > 1 else f[0]
+        x = array(y, copy=False, dtype=float)
+        N2 = x.shape[-1] // 2
+        return 1e6 * sum(x[..., 0:N2]**2, -1) + sum(x[..., N2:]**2, -1)
     def ellirot(self, x):
         return fcts.elli(array(x), 1)
     def hyperelli(self, x):
@@ -8382,22 +9342,25 @@ class FitnessFunctions(object):
         l = len(x) // 2
         felli = self.elli(x[:l])
         return felli + 1e-8 * sum(x[l:]**2)
+    @vectorized_objective
     def elli(self, x, rot=0, xoffset=0, cond=1e6, actuator_noise=0.0, both=False):
         """Ellipsoid test objective function"""
-        if not isscalar(x[0]):  # parallel evaluation
-            return [self.elli(xi, rot) for xi in x]  # could save 20% overall
+        if not isscalar(x[0]) and both:  # parallel evaluation
+            return [self.elli(xi, rot, xoffset, cond, actuator_noise, both) for xi in x]
+        x = array(x, copy=False, dtype=float)
         if rot:
-            x = rotate(x)
-        N = len(x)
+            x = rotate(x) if x.ndim == 1 else array([rotate(xi) for xi in x])
+        N = x.shape[-1]
         if actuator_noise:
-            x = x + actuator_noise * np.random.randn(N)
+            x = x + actuator_noise * np.random.randn(*x.shape)
 
-        ftrue = sum(cond**(np.arange(N) / (N - 1.)) * (x + xoffset)**2)
+        ftrue = sum(cond**(np.arange(N) / (N - 1.)) * (x + xoffset)**2, -1)
 
         alpha = 0.49 + 1. / N
         beta = 1
-        felli = np.random.rand(1)[0]**beta * ftrue * \
-                max(1, (10.**9 / (ftrue + 1e-99))**(alpha * np.random.rand(1)[0]))
+        r = np.random.rand(*(ftrue.shape + (2,)))  # two numbers per solution
+        felli = r[..., 0]**beta * ftrue * \
+                np.maximum(1, (10.**9 / (ftrue + 1e-99))**(alpha * r[..., 1]))
         # felli = ftrue + 1*np.random.randn(1)[0] / (1e-30 +
         #                                           np.abs(np.random.randn(1)[0]))**0
         if both:
@@ -8444,11 +9407,11 @@ class FitnessFunctions(object):
         else:
             f += cfac * sum(max(0, c + 1e-3)**2 for c in cvals)
         return f
+    @vectorized_objective
     def rosen(self, x, alpha=1e2):
         """Rosenbrock test objective function"""
-        x = [x] if isscalar(x[0]) else x  # scalar into list
-        f = [sum(alpha * (x[:-1]**2 - x[1:])**2 + (1. - x[:-1])**2) for x in x]
-        return f if len(f) > 1 else f[0]  # 1-element-list into scalar
+        x = array(x, copy=False, dtype=float)
+        return sum(alpha * (x[..., :-1]**2 - x[..., 1:])**2 + (1. - x[..., :-1])**2, -1)
     def grad_rosen(self, x, *args):
         N = len(x)
         grad = np.zeros(N)
@@ -8582,6 +9545,47 @@ def felli(x):
 
 # ____________________________________________
 # ____________________________________________________________
+def benchmark_eigen(dimensions=(30, 100, 300, 1000, 3000), iterations=100,
+                    timefracs=(None, 0.1), eval_time=1e-3):
+    """time the sampling and the eigendecomposition of
+    `CMAEvolutionStrategy` for each dimension in `dimensions` and each
+    ``CMA_eigen_timefrac`` setting in `timefracs`.
+
+    Each evaluation of the ellipsoid function is padded with a sleep of
+    `eval_time` seconds to mimic an expensive objective, which is
+    what the ``CMA_eigen_timefrac`` schedule is amortized against.
+    Printed are, per iteration, the time in `ask` and `tell` in
+    milliseconds, and the total time in `updateBD` with the number of
+    eigendecompositions.
+
+    Example::
+
+        import cma
+        cma.benchmark_eigen((30, 100, 300), iterations=50)
+
+    """
+    print('     N  timefrac  ask[ms]  tell[ms]  updateBD[s]  #eigen')
+    for N in dimensions:
+        for timefrac in timefracs:
+            es = CMAEvolutionStrategy(N * [1], 1, {'CMA_eigen_timefrac': timefrac,
+                                                  'verbose': -9, 'seed': 1})
+            t_ask, t_tell = 0., 0.
+            for _i in xrange(iterations):
+                tic = time.time()
+                X = es.ask()
+                t_ask += time.time() - tic
+                f = []
+                for x in X:
+                    time.sleep(eval_time)
+                    f.append(fcts.elli(x))
+                tic = time.time()
+                es.tell(X, f)
+                t_tell += time.time() - tic
+            print('%6d %9s %8.2f %9.2f %12.2f %7d' % (N, str(timefrac),
+                    1e3 * t_ask / iterations, 1e3 * t_tell / iterations,
+                    es.timer_eigen, es.count_eigen))
+            sys.stdout.flush()
+
 def _test(module=None):  # None is fine when called from inside the module
     import doctest
     print(doctest.testmod(module))  # this is pretty coool!
@@ -1,6 +1,10 @@
+import multiprocessing
+
 import cma
 import numpy as np
 
+from simulation import SimulationFailure
+
 class Problem:
     def __init__(self, worldIn, simIn, evalIn):
 
@@ -13,16 +17,168 @@ class Problem:
         # an evaluator
         self.eval = evalIn
 
+        # multi-fidelity evaluation is off until setMultiFidelity is called
+        #   .. screenSim is the cheap simulation every candidate is run through first
+        #   .. eliteFraction is the part of each population re-evaluated with self.sim
+        #   .. rankAgreement collects, per generation, how well the cheap ranking matched the exact ranking
+        self.screenSim = None
+        self.eliteFraction = 1.0
+        self.rankAgreement = []
+
+        # surrogate pre-screening is off until setSurrogate is called
+        #   .. the surrogate ranks each population, and only the promising part plus a control sample is simulated
+        #   .. surrogateAgreement collects, per generation, how well the surrogate ranked the simulated candidates
+        self.surrogate = None
+        self.promisingFraction = 1.0
+        self.numControl = 0
+        self.minSurrogateAgreement = 0.0
+        self.surrogateAgreement = []
+        self.skipSurrogate = False
+
+        # large force vectors are optimized with a diagonal covariance matrix .. O(n) time per sample and O(n) memory
+        #   .. diagonalDimension is the problem size from which on this happens
+        #   .. diagonalIterations is True for the whole run, or the number of iterations before switching to full covariance
+        self.diagonalDimension = 1000
+        self.diagonalIterations = True
+
+
+    # screen every population with a cheap simulation (Euler, coarser timestep, no checks)
+    #   .. and only re-evaluate the best eliteFraction of it with the real simulation
+    #   .. an eliteFraction of at least 0.5 covers the parents CMA selects with its default weights
+    def setMultiFidelity(self, eliteFraction=0.5, coarsenFactor=4):
+        assert (eliteFraction > 0) and (eliteFraction <= 1)
+        self.screenSim = self.sim.makeScreeningSimulation(coarsenFactor)
+        self.eliteFraction = eliteFraction
+        self.rankAgreement = []
+
+
+    # rank each population with a surrogate fit to everything simulated so far
+    #   .. only the best promisingFraction, plus numControl random others, are sent to the simulator
+    #   .. the control sample keeps the surrogate honest .. if the surrogate ranks the simulated candidates
+    #      worse than minSurrogateAgreement, the whole next population is simulated
+    def setSurrogate(self, surrogate, promisingFraction=0.5, numControl=1, minSurrogateAgreement=0.5):
+        assert (promisingFraction > 0) and (promisingFraction <= 1)
+        self.surrogate = surrogate
+        self.promisingFraction = promisingFraction
+        self.numControl = numControl
+        self.minSurrogateAgreement = minSurrogateAgreement
+        self.surrogateAgreement = []
+        self.skipSurrogate = False
+
+
+    # use a diagonal covariance matrix for problems with at least minDimension variables
+    #   .. for iterations iterations, after which CMA switches to a full covariance matrix, or True to stay diagonal
+    def setDiagonalCovariance(self, minDimension, iterations=True):
+        self.diagonalDimension = minDimension
+        self.diagonalIterations = iterations
+
+
+    # the CMA options that depend on the problem size rather than on a particular run
+    def getCMAOptions(self, problemSize):
+        options = {}
+        if problemSize >= self.diagonalDimension:
+            options['CMA_diagonal'] = self.diagonalIterations
+        return options
+
 
     def simulate(self, x, doPlot=False):
         self.sim.simulate(self.world, x, doPlot)
 
 
+    # every full-fidelity evaluation also goes into the surrogate's archive
     def evaluate(self, x):
-        self.simulate(x)
-        value = self.eval.evaluate(self.world, self.sim.numPhases, x)
+        value = self.evaluateWithSimulation(self.sim, x)
+        if self.surrogate is not None:
+            self.surrogate.add(x, value)
+        return value
+
+    def evaluateWithSimulation(self, sim, x):
+        sim.simulate(self.world, x)
+        value = self.eval.evaluate(self.world, sim.numPhases, x)
         return value
 
+
+    # evaluate a whole CMA population, returning one value per candidate
+    def evaluatePopulation(self, solutions):
+
+        # no usable surrogate (or it failed last generation's control) .. simulate everyone
+        if (self.surrogate is None) or (not self.surrogate.isReady()) or self.skipSurrogate:
+            self.skipSurrogate = False
+            return self.evaluateCandidates(solutions)
+
+        # rank the population with the surrogate
+        predicted = self.surrogate.predict(solutions)
+        order = np.argsort(predicted)
+
+        # simulate the promising candidates and a random control sample of the rest
+        numPromising = min(len(solutions), max(2, int(np.ceil(self.promisingFraction * len(solutions)))))
+        rest = order[numPromising:]
+        numControl = min(len(rest), self.numControl)
+        control = np.random.permutation(rest)[:numControl]
+        simulated = np.concatenate([order[:numPromising], control]).astype(int)
+        simulatedValues = np.array(self.evaluateCandidates([solutions[i] for i in simulated]))
+
+        agreement = rankCorrelation(predicted[simulated], simulatedValues)
+        self.surrogateAgreement.append(agreement)
+        self.skipSurrogate = (agreement < self.minSurrogateAgreement)
+
+        # candidates that were not simulated keep the surrogate's order, behind every simulated candidate
+        values = np.empty(len(solutions))
+        values[simulated] = simulatedValues
+        notSimulated = np.setdiff1d(rest, control)
+        if len(notSimulated) > 0:
+            values[notSimulated] = simulatedValues.max() + (predicted[notSimulated] - predicted[order[numPromising-1]])
+
+        return list(values)
+
+    # the same, marked as a vectorized objective so cma hands it the whole population in one call
+    @cma.vectorized_objective
+    def evaluateBatch(self, solutions):
+        return self.evaluatePopulation(list(solutions))
+
+
+    # evaluate candidates with the simulation, screening with the cheap simulation first if multi-fidelity is on
+    def evaluateCandidates(self, solutions):
+
+        # single fidelity .. every candidate gets the real simulation
+        if self.screenSim is None:
+            return [self.evaluate(x) for x in solutions]
+
+        # screen everyone with the cheap simulation and sort by the cheap value
+        #   .. a screening run that gets stuck ranks its candidate behind every screened one
+        cheapValues = np.array([self.screen(x) for x in solutions])
+        failed = np.isnan(cheapValues)
+        if failed.all():
+            return [self.evaluate(x) for x in solutions]
+        cheapValues[failed] = cheapValues[~failed].max() + 1.0
+        order = np.argsort(cheapValues)
+
+        # re-evaluate the elites with the real simulation .. we need two of them to compare rankings
+        numElites = min(len(solutions), max(2, int(np.ceil(self.eliteFraction * len(solutions)))))
+        elites = order[:numElites]
+        exactValues = np.array([self.evaluate(solutions[i]) for i in elites])
+
+        self.rankAgreement.append(rankCorrelation(cheapValues[elites], exactValues))
+
+        # non-elites keep their cheap order, but are shifted so they all rank behind the worst elite
+        values = np.empty(len(solutions))
+        values[elites] = exactValues
+        if numElites < len(solutions):
+            rest = order[numElites:]
+            values[rest] = exactValues.max() + (cheapValues[rest] - cheapValues[elites[-1]])
+
+        return list(values)
+
+
+    # the value of x under the cheap simulation, or nan if that simulation failed
+    def screen(self, x):
+        try:
+            return self.evaluateWithSimulation(self.screenSim, x)
+        except SimulationFailure as e:
+            print "screening failed: {}".format(e)
+            return np.nan
+
+
     def simulateRandom(self):
 
         # how many variables do we have? .. compute the problem size
@@ -51,15 +207,175 @@ class Problem:
         # make the CMA object
         # the last argument is a single number indicating the spread within which
         #   we expect to see a solution .. here it is 100
-        es = cma.CMAEvolutionStrategy(problemSize*[0], 10.0)
+        es = cma.CMAEvolutionStrategy(problemSize*[0], 10.0, self.getCMAOptions(problemSize))
 
-        # run the optimization
+        # run the optimization .. the batch objective gets each whole population at once
         MAX_ITERATIONS = 1000
-        es.optimize(self.evaluate, MAX_ITERATIONS)
+        es.optimize(self.evaluateBatch, iterations=MAX_ITERATIONS, logger=es.logger)
 
         # get and print the final result
         print "Final result:  {}".format(es.result()[0])
 
+        if self.screenSim is not None:
+            print "Mean cheap/exact rank agreement:  {}".format(np.mean(self.rankAgreement))
+
+        if (self.surrogate is not None) and (len(self.surrogateAgreement) > 0):
+            print "Mean surrogate/simulation rank agreement:  {}".format(np.mean(self.surrogateAgreement))
+
+        # now we can run the simulation again, storing results for rendering / analysis
+        self.simulate(es.result()[0], True)
+
+
+    # run CMA asynchronously on numWorkers processes (default: one per cpu)
+    #   .. simulation times vary a lot between candidates, so rather than waiting for the slowest candidate
+    #      of every generation, CMA is updated as soon as a population's worth of results is back
+    #      and every idle worker immediately gets a new candidate
+    #   .. the surrogate and the multi-fidelity screening rank whole populations and are not used here
+    def runAsyncOptimizer(self, numWorkers=None, maxIterations=1000):
+
+        # how many variables do we have? .. compute the problem size
+        # .. right now, there is a force variable for every active object, for every phase
+        numActiveObjects = self.world.getNumberOfActiveObjects()
+        numDimensions = self.world.numDimensions
+        numPhases = self.sim.numPhases
+        problemSize = numPhases * numActiveObjects * numDimensions
+
+        es = cma.CMAEvolutionStrategy(problemSize*[0], 10.0, self.getCMAOptions(problemSize))
+
+        # the problem is handed to each worker once when the pool starts, not with every candidate
+        numWorkers = numWorkers or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(numWorkers, initAsyncWorker, (self,))
+        try:
+            driver = cma.CMAAsyncDriver(es, numWorkers)
+            driver.optimize(evaluateInWorker, pool=pool, iterations=maxIterations)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        print "Final result:  {}".format(es.result()[0])
+        print "Stale candidates:  {} of {}".format(driver.count_stale, driver.evaluations)
+
         # now we can run the simulation again, storing results for rendering / analysis
         self.simulate(es.result()[0], True)
 
+
+    # run a portfolio of CMA instances concurrently on numWorkers processes (default: one per cpu)
+    #   .. schedule 'IPOP' doubles the population size with every instance
+    #   .. schedule 'BIPOP' alternates those with small-population, small-sigma instances
+    #   .. all instances share the best value found so far .. an instance that is worse than it, and has not
+    #      improved its own best for patience iterations, is dominated and stops early
+    def runRestartPortfolio(self, numInstances=8, numWorkers=None, schedule='BIPOP', sigma=10.0, maxIterations=1000, patience=50):
+
+        # how many variables do we have? .. compute the problem size
+        # .. right now, there is a force variable for every active object, for every phase
+        numActiveObjects = self.world.getNumberOfActiveObjects()
+        numDimensions = self.world.numDimensions
+        numPhases = self.sim.numPhases
+        problemSize = numPhases * numActiveObjects * numDimensions
+
+        # one job per instance .. every instance gets its own seed so they do not sample identically
+        seeds = np.random.randint(1, 2**30, numInstances)
+        jobs = [(self, problemSize, popsize, instanceSigma, seed, maxIterations, patience)
+                for (popsize, instanceSigma), seed in zip(makeRestartSchedule(problemSize, numInstances, schedule, sigma), seeds)]
+
+        # the best value so far lives in shared memory, handed to each worker when the pool starts
+        sharedBest = multiprocessing.Value('d', np.inf)
+        pool = multiprocessing.Pool(numWorkers, initPortfolioWorker, (sharedBest,))
+        try:
+            results = pool.map(runPortfolioInstance, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+        for x, f, popsize, instanceSigma, iterations in results:
+            print "Instance popsize {} sigma {}:  f {} after {} iterations".format(popsize, instanceSigma, f, iterations)
+
+        # the global best over all instances
+        bestX, bestF = min(results, key=lambda result: result[1])[:2]
+        print "Final result:  {}".format(bestX)
+
+        # now we can run the simulation again, storing results for rendering / analysis
+        self.simulate(bestX, True)
+        return bestX, bestF
+
+
+# (popsize, sigma) for every instance of a restart portfolio
+#   .. IPOP: the default population size, doubled for every further instance
+#   .. BIPOP: even instances follow IPOP, odd instances use a small population and sigma drawn as in BIPOP-CMA-ES
+#      .. since instances run side by side rather than one after another, the small regime is scaled by the
+#         largest IPOP population scheduled so far
+def makeRestartSchedule(problemSize, numInstances, schedule, sigma):
+    defaultPopsize = 4 + int(3 * np.log(problemSize))
+
+    if schedule == 'IPOP':
+        return [(defaultPopsize * 2**i, sigma) for i in range(numInstances)]
+
+    assert schedule == 'BIPOP', "restart schedule {} not found".format(schedule)
+    instances = []
+    largePopsize = defaultPopsize
+    for i in range(numInstances):
+        if i % 2 == 0:
+            largePopsize = defaultPopsize * 2**(i // 2)
+            instances.append((largePopsize, sigma))
+        else:
+            u = np.random.rand()
+            smallPopsize = int(defaultPopsize * (0.5 * largePopsize / defaultPopsize)**(u * u))
+            instances.append((max(smallPopsize, defaultPopsize), sigma * 10**(-2 * np.random.rand())))
+    return instances
+
+
+# the shared best-so-far value for the portfolio instances run by this process
+sharedBest = None
+
+def initPortfolioWorker(sharedBestIn):
+    global sharedBest
+    sharedBest = sharedBestIn
+
+
+# run one instance of a restart portfolio .. this lives at module level so the pool can pickle it
+def runPortfolioInstance(job):
+    problem, problemSize, popsize, sigma, seed, maxIterations, patience = job
+
+    options = problem.getCMAOptions(problemSize)
+    options.update({'popsize': popsize, 'seed': seed, 'verb_disp': 0, 'verb_log': 0, 'verbose': -9})
+    es = cma.CMAEvolutionStrategy(problemSize*[0], sigma, options)
+
+    ownBest = np.inf
+    lastImprovement = 0
+    while not es.stop() and es.countiter < maxIterations:
+        solutions = es.ask()
+        es.tell(solutions, problem.evaluatePopulation(solutions))
+
+        # publish our improvements .. or give up if we are dominated and stuck
+        if es.best.f < ownBest:
+            ownBest = es.best.f
+            lastImprovement = es.countiter
+            with sharedBest.get_lock():
+                if ownBest < sharedBest.value:
+                    sharedBest.value = ownBest
+
+        elif (ownBest > sharedBest.value) and (es.countiter - lastImprovement > patience):
+            break
+
+    return es.best.x, es.best.f, popsize, sigma, es.countiter
+
+
+# the problem evaluated by this process for the asynchronous optimizer
+workerProblem = None
+
+def initAsyncWorker(problem):
+    global workerProblem
+    workerProblem = problem
+
+
+# evaluate one candidate of the asynchronous optimizer .. this lives at module level so the pool can pickle it
+def evaluateInWorker(x):
+    return workerProblem.evaluateWithSimulation(workerProblem.sim, x)
+
+
+# Spearman rank correlation between two sets of values for the same candidates
+#   .. 1 means the two orderings agree exactly, -1 means one is exactly backwards
+def rankCorrelation(a, b):
+    n = len(a)
+    rankDiff = np.argsort(np.argsort(a)) - np.argsort(np.argsort(b))
+    return 1.0 - 6.0 * np.dot(rankDiff, rankDiff) / (n * (n*n - 1.0))
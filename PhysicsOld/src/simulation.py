@@ -9,10 +9,17 @@ class Integrator:
     Euler, QuadraticExact = range(2)
 
 
+# raised instead of exiting when a simulation without sanity checks gets stuck
+#   .. so a failed screening run only costs its own candidate, not the whole optimizer
+class SimulationFailure(Exception):
+    pass
+
+
 class Simulation:
     def __init__(self):
         self.numPhases = 0
         self.integrator = Integrator.Euler
+        self.validate = True
 
     def setNumPhases(self, phasesIn):
         self.numPhases = phasesIn
@@ -26,6 +33,25 @@ class Simulation:
     def setIntegrator(self, integratorIn):
         self.integrator = integratorIn
 
+    # turn the sanity checks during advance on or off .. they cost time and may exit the program
+    def setValidation(self, validateIn):
+        self.validate = validateIn
+
+
+    # make a cheap version of this simulation for screening candidate solutions
+    #   .. Euler integration, no sanity checks, and timesteps coarsened by coarsenFactor
+    #   .. the phase length stays the same, so the force vector means the same thing for both simulations
+    def makeScreeningSimulation(self, coarsenFactor=4):
+        screenTimestepsPerPhase = max(1, self.timestepsPerPhase // coarsenFactor)
+
+        sim = Simulation()
+        sim.setNumPhases(self.numPhases)
+        sim.setTimestepsPerPhase(screenTimestepsPerPhase)
+        sim.setTimestep(self.timestep * self.timestepsPerPhase / float(screenTimestepsPerPhase))
+        sim.setIntegrator(Integrator.Euler)
+        sim.setValidation(False)
+        return sim
+
 
     # this function returns the force which will be used to accelerate the particle
     #   .. if we want force that will be applied to a moveable object, we must use the original
@@ -47,15 +73,18 @@ class Simulation:
                 removeList.append(manifold)
 
             # check case (3) we have penetrated the manifold
+            #   .. without validation (e.g. a coarse Euler screening run) we just project back to the manifold
             if (normalDist < 0):
-                assert(-1.0*normalDist < collisionEpsilon)     # too much penetration --> exit
+                if self.validate:
+                    assert(-1.0*normalDist < collisionEpsilon)     # too much penetration --> exit
                 p.position = manifold.projectToManifold(p.position)
 
             # check case (4)
             if (normalVelocity < 0):
                 unitNormal = manifold.getUnitNormal()
                 print "we have velocity {} into manifold normal {} at point {}".format(p.velocity, unitNormal, p.position)
-                assert ((-1.0*normalVelocity) < velocityEpsilon)    # too much velocity into manifold --> exit
+                if self.validate:
+                    assert ((-1.0*normalVelocity) < velocityEpsilon)    # too much velocity into manifold --> exit
                 p.velocity -= np.dot(p.velocity, unitNormal) * unitNormal
 
         # remove those manifolds we have left or are leaving
@@ -181,6 +210,9 @@ class Simulation:
         # what we do depends on the velocity direction..
         
         # first, make sure velocity is not going out of the manifold
+        #   .. without validation (e.g. a coarse Euler screening run) we just leave an outgoing velocity alone
+        if not self.validate and normalVelocityDotProduct > 0:
+            return
         assert(normalVelocityDotProduct <= 0)
 
         if (tangentVelocityMagnitude < velocityEpsilon) or (tangentVelocityMagnitude < (mu*normalVelocityMagnitude)):
@@ -309,11 +341,15 @@ class Simulation:
 
             # there should be some frictional force
             forceMagnitude = np.linalg.norm(force)
+            if not self.validate and forceMagnitude == 0:
+                return None
             assert (forceMagnitude > 0)
             unitForce = force / forceMagnitude
 
             # get the velocity in this direction, which should be negative
             velDotForce = np.dot(p.velocity, unitForce)
+            if not self.validate and velDotForce >= 0:
+                return None
             if (velDotForce >= 0):
                 print "there is no velocity in force direction"
                 print p.position
@@ -347,6 +383,8 @@ class Simulation:
         if (orthogonalVelocityNorm > world.velocityEpsilon):
 
             # force should oppose the velocity, because it should just be frictional
+            if not self.validate and np.dot(orthogonalVelocity, orthogonalForce) >= 0:
+                return None
             assert(np.dot(orthogonalVelocity, orthogonalForce) < 0)
 
             # time is just velocity / force for these unit mass particles
@@ -414,6 +452,8 @@ class Simulation:
 
     # sanity check .. did the integrator take us where the event detector expected?
     def checkPosition(self, pos, expectedPos, collisionEpsilon):
+        if not self.validate:
+            return True
         posDiff = np.linalg.norm(pos - expectedPos)
         if (posDiff > collisionEpsilon):
             print "pos {} .. expected {}".format(pos, expectedPos)
@@ -423,6 +463,8 @@ class Simulation:
         
     # sanity check .. did the integrator take us where the zero velocity calculation predicted?
     def checkVelocityZero(self, vel, direction, velocityEpsilon):
+        if not self.validate:
+            return
         velDotDirection = np.dot(vel, direction)
         if (velDotDirection > velocityEpsilon):
             print "expected zero velocity in direction {} got {} .. velocity is {}".format(direction, velDotDirection, vel)
@@ -430,6 +472,8 @@ class Simulation:
 
     # sanity check .. did the integrator give us a result where we have significant velocity *into* a contact surface?
     def checkVelocityAgainstManifolds(self, p, force, velocityEpsilon):
+        if not self.validate:
+            return
         # loop over manifolds
         for manifold in p.collisionManifolds:
             velAgainstNormal = -1.0*np.dot(p.velocity, manifold.getUnitNormal())
@@ -448,7 +492,10 @@ class Simulation:
 
         # stop infinite recursion
         if count > 10:
-            print "called advanceActiveObject 10 times and we still have {} time to go".format(timeToGo)
+            message = "called advanceActiveObject 10 times and we still have {} time to go".format(timeToGo)
+            if not self.validate:
+                raise SimulationFailure(message)
+            print message
             sys.exit([0])
 
         # if the particle is already on any manifolds, we need to adjust the force to match those manifolds
@@ -546,7 +593,7 @@ class Simulation:
                         forceRes[pIndex, resCount] = force
 
                     # check if we have tunneled...
-                    if (p.position[1] < 20) and (p.position[0] < 35):
+                    if self.validate and (p.position[1] < 20) and (p.position[0] < 35):
                         # we should not be here ...
                         print "position {}".format(res)
                         print "velocity {}".format(velRes)
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+# a cheap model of the objective, fit to the archive of (x, f) pairs we have already simulated
+#   .. the model is a cubic radial basis function interpolant with a linear tail
+#   .. only the most recent trainingSize points are used, since CMA's recent candidates are the local ones
+#   .. (at least numDimensions + 2 of them, see getTrainingSize)
+class Surrogate:
+    def __init__(self, trainingSize=100, maxArchiveSize=1000):
+        self.trainingSize = trainingSize
+        self.maxArchiveSize = maxArchiveSize
+
+        self.archiveX = []
+        self.archiveF = []
+
+        # fitted model .. refit lazily whenever the archive has changed
+        self.centers = None
+        self.weights = None
+        self.tail = None
+        self.needsFit = True
+
+
+    def add(self, x, f):
+        self.archiveX.append(np.array(x, dtype=float))
+        self.archiveF.append(float(f))
+
+        # forget the oldest points once the archive is full
+        if len(self.archiveX) > max(self.maxArchiveSize, self.getTrainingSize(len(x))):
+            del self.archiveX[0]
+            del self.archiveF[0]
+
+        self.needsFit = True
+
+
+    # the linear tail has numDimensions + 1 coefficients, so we train on at least numDimensions + 2 points
+    #   .. otherwise the surrogate could never become ready for large force vectors
+    def getTrainingSize(self, numDimensions):
+        return max(self.trainingSize, numDimensions + 2)
+
+
+    # we need more points than the linear tail has coefficients before the fit means anything
+    def isReady(self):
+        if len(self.archiveX) == 0:
+            return False
+        numDimensions = len(self.archiveX[0])
+        return len(self.archiveX) >= numDimensions + 2
+
+
+    def fit(self):
+        trainingSize = self.getTrainingSize(len(self.archiveX[0]))
+        X = np.array(self.archiveX[-trainingSize:])
+        f = np.array(self.archiveF[-trainingSize:])
+        numPoints, numDimensions = X.shape
+
+        # interpolation system  [Phi P; P^T 0] [weights; tail] = [f; 0]
+        # .. P is the linear tail (1, x) .. we use least squares since nearby CMA samples make Phi badly conditioned
+        P = np.hstack([np.ones((numPoints, 1)), X])
+        A = np.zeros((numPoints + numDimensions + 1, numPoints + numDimensions + 1))
+        A[:numPoints, :numPoints] = kernel(pairwiseDistances(X, X))
+        A[:numPoints, numPoints:] = P
+        A[numPoints:, :numPoints] = P.T
+        rhs = np.concatenate([f, np.zeros(numDimensions + 1)])
+
+        coefficients = np.linalg.lstsq(A, rhs, rcond=None)[0]
+
+        self.centers = X
+        self.weights = coefficients[:numPoints]
+        self.tail = coefficients[numPoints:]
+        self.needsFit = False
+
+
+    # predicted objective values for a list of candidates
+    def predict(self, solutions):
+        if self.needsFit:
+            self.fit()
+
+        X = np.array(solutions, dtype=float)
+        values = np.dot(kernel(pairwiseDistances(X, self.centers)), self.weights)
+        values += self.tail[0] + np.dot(X, self.tail[1:])
+        return values
+
+
+
+def kernel(r):
+    return r * r * r
+
+
+# euclidean distance between every row of A and every row of B
+def pairwiseDistances(A, B):
+    sqrDist = (A * A).sum(axis=1)[:, np.newaxis] + (B * B).sum(axis=1)[np.newaxis, :] - 2.0 * np.dot(A, B.T)
+    return np.sqrt(np.maximum(sqrDist, 0.0))